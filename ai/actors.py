@@ -0,0 +1,88 @@
+import queue
+import random
+import signal
+import numpy as np
+from ai.inference import NumpyInference
+from game.board import Connect4Board
+
+"""
+actors has the code that runs inside the self-play worker processes for the actor/learner
+training mode. the workers only play games, the learner process (TrainingManager) owns the
+replay memory and does all of the gradient steps.
+nothing in here imports tensorflow so that starting a worker stays cheap, the workers run
+the q network with NumpyInference using the weights the learner sends them.
+"""
+
+"""
+choose_action(network, epsilon, state, valid_moves) picks a move the same way QAgent.act does
+network is the NumpyInference made from the learner's weights
+"""
+def choose_action(network, epsilon, state, valid_moves):
+    if random.random() <= epsilon:
+        return random.choice(valid_moves)
+    q_values = network.predict(state)
+    return max(valid_moves, key=lambda move: q_values[move])
+
+
+"""
+self_play_episode(board, network, epsilon) plays one game of the network against itself
+it gives out the same rewards as TrainingManager._self_play_episode
+returns (winner, transitions) where winner is 0 for a draw
+"""
+def self_play_episode(board, network, epsilon):
+    board.reset()
+    transitions = []
+    reward = 0
+    current_player = random.randint(1, 2)
+    while True:
+        state = board.get_board_state()
+        valid_moves = board.get_valid_moves()
+        if not valid_moves:
+            return 0, transitions
+        action = choose_action(network, epsilon, state, valid_moves)
+        row = board.make_move(action, current_player)
+        reward += 10
+        new_state = board.get_board_state()
+        if board.check_winner(current_player, row, action):
+            if current_player == 1:
+                reward += 100
+            else:
+                reward += -100
+            transitions.append((state.astype(np.int8), action, reward, new_state.astype(np.int8), True))
+            return current_player, transitions
+        transitions.append((state.astype(np.int8), action, reward, new_state.astype(np.int8), False))
+        current_player = 3 - current_player
+
+
+"""
+actor_worker(weights_queue, results_queue, stop_event, seed) is the loop each worker process runs
+weights_queue is where the learner sends (weights, epsilon) whenever it refreshes the workers
+results_queue is where the worker sends (winner, transitions) after every game
+stop_event tells the worker to finish
+seed keeps the workers from all playing the same random games
+"""
+def actor_worker(weights_queue, results_queue, stop_event, seed):
+    # ctrl-c is handled by the learner, which saves a checkpoint and stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    random.seed(seed)
+    np.random.seed(seed % (2 ** 32))
+    board = Connect4Board()
+    weights, epsilon = weights_queue.get()
+    network = NumpyInference(weights)
+    while not stop_event.is_set():
+        # only keep the newest weights if the learner sent more than one
+        try:
+            while True:
+                weights, epsilon = weights_queue.get_nowait()
+                network = NumpyInference(weights)
+        except queue.Empty:
+            pass
+        result = self_play_episode(board, network, epsilon)
+        # the queue is bounded so a slow learner holds the workers back instead of
+        # piling up games in memory
+        while not stop_event.is_set():
+            try:
+                results_queue.put(result, timeout=0.1)
+                break
+            except queue.Full:
+                pass
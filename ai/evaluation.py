@@ -0,0 +1,188 @@
+import argparse
+import math
+import time
+import numpy as np
+from ai.heuristics import HEURISTICS, make_heuristic
+from game.batch_env import BatchConnect4Env
+
+Z_95 = 1.96  # z score for 95% confidence intervals
+OPPONENTS = ['random', 'search', 'mcts'] + list(HEURISTICS)
+
+"""
+evaluation plays large numbers of games to measure how strong an agent is
+the games run in lockstep in a BatchConnect4Env, so every ply of every game in a batch
+is one forward pass of the agent's network instead of one predict per move per game
+nothing is remembered and no training stats are touched, so it is safe to run in the middle of training
+the first few moves of every game are random, like in the tournament, because a greedy agent against
+a deterministic opponent (like SearchAgent) would otherwise play the same game every time, and the
+confidence intervals are only right when the games are independent of each other
+evaluate a saved model from the project folder with: python -m ai.evaluation --model new_model --games 10000
+"""
+
+"""
+RandomOpponent class
+plays a random valid column, the default opponent for evaluate
+"""
+class RandomOpponent:
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.epsilon = 0
+
+    """
+    act(self, state, valid_moves) picks a random valid move for one game
+    """
+    def act(self, state, valid_moves, position_hash=None, mirror_hash=None):
+        return int(self.rng.choice(valid_moves))
+
+    """
+    act_batch(self, states, valid_mask) picks a random valid column for every game in a batch
+    """
+    def act_batch(self, states, valid_mask):
+        scores = self.rng.random(valid_mask.shape)
+        scores[~valid_mask] = -1
+        return np.argmax(scores, axis=1)
+
+
+"""
+opponent_moves(opponent, states, valid_mask) gets the opponent's move in every game
+opponents with act_batch (QAgent, RandomOpponent, HeuristicOpponent) move in all the games at once,
+anything else (like SearchAgent or MCTSAgent) is asked one game at a time with act
+"""
+def opponent_moves(opponent, states, valid_mask):
+    if hasattr(opponent, 'act_batch'):
+        return opponent.act_batch(states, valid_mask)
+    return np.array([opponent.act(state, np.flatnonzero(valid).tolist()) for state, valid in zip(states, valid_mask)],
+                    dtype=np.intp)
+
+
+"""
+wilson_interval(successes, n, z) is the wilson score confidence interval for a rate
+it stays inside 0-1 and works even when the rate is 0 or 1, unlike the usual p +- z * sqrt(p(1 - p) / n)
+"""
+def wilson_interval(successes, n, z=Z_95):
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+"""
+evaluate(agent, num_games, opponent, batch_size, seed, opening_plies) plays num_games games of agent against opponent
+agent moves first (as player 1) with no exploration, like in TrainingManager.evaluate_agent
+opponent is anything with act(state, valid_moves), or act_batch(states, valid_mask) to be fast,
+random moves if None
+batch_size is how many games are played at the same time
+opening_plies is how many random moves start every game (for both players) so the games differ
+returns a dict with the win/loss/draw counts and rates and their 95% confidence intervals,
+plus score (a win is 1, a draw is 0.5) with its confidence interval
+"""
+def evaluate(agent, num_games=10000, opponent=None, batch_size=1000, seed=None, opening_plies=2):
+    if opponent is None:
+        opponent = RandomOpponent(seed)
+    opening = RandomOpponent(None if seed is None else seed + 1)
+    env = BatchConnect4Env(min(batch_size, num_games), auto_reset=False)
+    wins = losses = draws = 0
+    start = time.perf_counter()
+    remaining = num_games
+    while remaining > 0:
+        count = min(env.num_envs, remaining)
+        env.reset()
+        active = np.zeros(env.num_envs, dtype=bool)
+        active[:count] = True
+        player = 1  # the games all move together, so it is the same player's turn in every game
+        ply = 0
+        while active.any():
+            states = env.get_board_states()[active]
+            valid_mask = env.valid_move_mask()[active]
+            actions = np.zeros(env.num_envs, dtype=np.intp)
+            if ply < opening_plies:
+                actions[active] = opening.act_batch(states, valid_mask)
+            elif player == 1:
+                actions[active] = agent.act_batch(states, valid_mask, epsilon=0)
+            else:
+                actions[active] = opponent_moves(opponent, states, valid_mask)
+            _, winners, dones = env.step(actions, active)
+            wins += np.count_nonzero(winners == 1)
+            losses += np.count_nonzero(winners == 2)
+            draws += np.count_nonzero(dones & (winners == 0))
+            active &= ~dones
+            player = 3 - player
+            ply += 1
+        remaining -= count
+    elapsed = time.perf_counter() - start
+    score = (wins + 0.5 * draws) / num_games
+    # variance of one game's score (1, 0.5 or 0) for the normal approximation interval
+    variance = (wins + 0.25 * draws) / num_games - score * score
+    score_half_width = Z_95 * math.sqrt(max(variance, 0.0) / num_games)
+    return {
+        'games': num_games,
+        'wins': wins,
+        'losses': losses,
+        'draws': draws,
+        'win_rate': wins / num_games,
+        'loss_rate': losses / num_games,
+        'draw_rate': draws / num_games,
+        'win_rate_ci': wilson_interval(wins, num_games),
+        'loss_rate_ci': wilson_interval(losses, num_games),
+        'draw_rate_ci': wilson_interval(draws, num_games),
+        'score': score,
+        'score_ci': (max(0.0, score - score_half_width), min(1.0, score + score_half_width)),
+        'games_per_second': num_games / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+"""
+print_results(results) prints what evaluate returned
+"""
+def print_results(results):
+    print(f"Games: {results['games']} ({results['games_per_second']:.0f} games/sec)")
+    for name in ['win', 'loss', 'draw']:
+        low, high = results[f'{name}_rate_ci']
+        print(f"{name.capitalize()} Rate: {results[f'{name}_rate']:.3f} (95% CI {low:.3f}-{high:.3f})")
+    low, high = results['score_ci']
+    print(f"Score: {results['score']:.3f} (95% CI {low:.3f}-{high:.3f})")
+
+
+"""
+make_opponent(name, time_budget_ms) creates an opponent for the command line by name
+"""
+def make_opponent(name, time_budget_ms=50):
+    if name == 'random':
+        return RandomOpponent()
+    elif name == 'search':
+        from ai.search_agent import SearchAgent
+        return SearchAgent(time_budget_ms=time_budget_ms, player=2)
+    elif name == 'mcts':
+        from ai.mcts_agent import MCTSAgent
+        return MCTSAgent(time_budget_ms=time_budget_ms, player=2)
+    elif name in HEURISTICS:
+        return make_heuristic(name)
+    raise ValueError(f"Invalid opponent. Choose from {OPPONENTS}")
+
+
+def main(argv=None):
+    from ai.q_agent import QAgent
+    parser = argparse.ArgumentParser(description='Evaluate a saved model over many games.')
+    parser.add_argument('--model', required=True, help='name of the saved model to evaluate')
+    parser.add_argument('--games', type=int, default=10000, help='number of games to play')
+    parser.add_argument('--opponent', default='random', choices=OPPONENTS,
+                        help='who the model plays against')
+    parser.add_argument('--opponent-ms', type=int, default=50, help='thinking time per move for search opponents')
+    parser.add_argument('--batch-size', type=int, default=1000, help='games played at the same time')
+    parser.add_argument('--opening-plies', type=int, default=2,
+                        help='random moves at the start of each game so the games differ')
+    parser.add_argument('--models-dir', default='models/saved_models', help='where models are saved')
+    args = parser.parse_args(argv)
+    agent = QAgent()
+    agent.models_dir = args.models_dir
+    agent.load_model(args.model)
+    results = evaluate(agent, args.games, make_opponent(args.opponent, args.opponent_ms), args.batch_size,
+                       opening_plies=args.opening_plies)
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import numpy as np
+from game.batch_env import win_lines
+from game.turns import players_to_move
+
+"""
+heuristics has cheap scripted opponents to train and evaluate against
+they work on a whole batch of boards at once with numpy, using the lines of four from win_lines,
+so hundreds of games can get a move without any network or python loop over the games
+"""
+
+"""
+ThreatFinder class
+finds the cells where a player would complete four in a row, for a batch of boards
+it keeps the lines of four as an index array and an incidence matrix from (line, position in line)
+to board cell, so every cell's threats for every board come out of one matrix multiply
+"""
+class ThreatFinder:
+    def __init__(self, rows=6, cols=7):
+        self.rows = rows
+        self.cols = cols
+        self.lines = win_lines(rows, cols)
+        # incidence[l * 4 + k][cell] is 1 when position k of line l is that cell
+        self.incidence = np.zeros((self.lines.size, rows * cols), dtype=np.float32)
+        self.incidence[np.arange(self.lines.size), self.lines.reshape(-1)] = 1
+
+    """
+    threat_cells(self, boards, players) returns an (N, rows * cols) boolean array of the empty cells
+    that would give each board's player four in a row (whether or not they can be played yet)
+    boards is an (N, rows * cols) array, players has the player to look at for each board
+    """
+    def threat_cells(self, boards, players):
+        cells = boards[:, self.lines]  # (N, lines, 4)
+        players = np.asarray(players).reshape(-1, 1, 1)
+        three = (cells == players).sum(axis=2) == 3
+        empty = cells == 0
+        # the empty cell of every line that has three of the player's pieces and nothing else
+        open_cells = (three[:, :, None] & empty).reshape(len(boards), self.lines.size)
+        return (open_cells.astype(np.float32) @ self.incidence) > 0
+
+    """
+    landing_cells(self, boards) returns (cells, valid_mask)
+    cells[n][c] is the cell a piece dropped in column c of board n lands in (0 for a full column)
+    """
+    def landing_cells(self, boards):
+        grid = boards.reshape(len(boards), self.rows, self.cols)
+        heights = (grid != 0).sum(axis=1)
+        valid_mask = heights < self.rows
+        rows = np.where(valid_mask, self.rows - 1 - heights, 0)
+        return rows * self.cols + np.arange(self.cols), valid_mask
+
+
+"""
+HeuristicOpponent class
+picks a move with a few fixed rules, checked in order, for every board in a batch:
+    win: play a move that wins right away
+    block: play where the other player would win next move
+    lookahead: don't play under a cell where the other player would win (a one ply lookahead)
+    center: prefer columns near the center
+whatever is still allowed after the rules is chosen at random
+it has the same act(state, valid_moves) and act_batch(states, valid_mask) as QAgent
+so it can be used anywhere an opponent is, but it never needs the network
+"""
+class HeuristicOpponent:
+    def __init__(self, win=True, block=True, lookahead=False, center=False, player=None, rows=6, cols=7,
+                 seed=None):
+        self.win = win
+        self.block = block
+        self.lookahead = lookahead
+        self.center = center
+        self.player = player  # which player this is, used when it can't be told from the board
+        self.epsilon = 0
+        self.threats = ThreatFinder(rows, cols)
+        self.rng = np.random.default_rng(seed)
+        # a bonus for every column by how close it is to the center, the random part of the score is
+        # scaled down when it is used so columns near the center are usually but not always picked
+        self.center_bonus = 0.5 - np.abs(np.arange(cols) - cols // 2) / cols
+
+    """
+    act(self, state, valid_moves) picks a move for one board
+    """
+    def act(self, state, valid_moves, position_hash=None, mirror_hash=None):
+        valid_mask = np.zeros((1, self.threats.cols), dtype=bool)
+        valid_mask[0, valid_moves] = True
+        return int(self.act_batch(np.asarray(state).reshape(1, -1), valid_mask)[0])
+
+    """
+    act_batch(self, states, valid_mask) picks a move for every board in a batch
+    states is an (N, 42) array of boards, valid_mask is an (N, 7) boolean array of valid columns
+    """
+    def act_batch(self, states, valid_mask, epsilon=None):
+        states = np.asarray(states)
+        players = players_to_move(states, self.player or 1)
+        landing, _ = self.threats.landing_cells(states)
+        rows = np.arange(len(states))[:, None]
+        # every rule narrows down the allowed moves, but only in the boards where it finds something
+        allowed = valid_mask.copy()
+        if self.win:
+            wins = self.threats.threat_cells(states, players)[rows, landing] & allowed
+            allowed = np.where(wins.any(axis=1, keepdims=True), wins, allowed)
+        if self.block:
+            their_wins = self.threats.threat_cells(states, 3 - players)[rows, landing] & allowed
+            allowed = np.where(their_wins.any(axis=1, keepdims=True), their_wins, allowed)
+        if self.lookahead:
+            # playing under a cell the other player needs lets them play there next
+            their_threats = self.threats.threat_cells(states, 3 - players)
+            above = landing - self.threats.cols
+            gives_win = (above >= 0) & their_threats[rows, np.maximum(above, 0)]
+            safe = allowed & ~gives_win
+            allowed = np.where(safe.any(axis=1, keepdims=True), safe, allowed)
+        scores = self.rng.random(allowed.shape)
+        if self.center:
+            scores = scores * 0.5 + self.center_bonus
+        scores[~allowed] = -np.inf
+        return np.argmax(scores, axis=1)
+
+HEURISTICS = {
+    'win': dict(win=True, block=False),
+    'block': dict(win=True, block=True),
+    'center': dict(win=True, block=True, center=True),
+    'lookahead': dict(win=True, block=True, lookahead=True, center=True),
+}
+
+"""
+make_heuristic(name, player, seed) creates one of the HEURISTICS opponents by name
+from the weakest ('win' only takes wins) to the strongest ('lookahead')
+"""
+def make_heuristic(name, player=2, seed=None):
+    if name not in HEURISTICS:
+        raise ValueError(f"Invalid heuristic. Choose from {list(HEURISTICS)}")
+    return HeuristicOpponent(player=player, seed=seed, **HEURISTICS[name])
@@ -0,0 +1,116 @@
+import time
+import numpy as np
+from ai.search_agent import SearchAgent, WIN_SCORE
+
+"""
+This is the HybridAgent class
+it looks a few moves ahead like the SearchAgent, but instead of a hand written score it asks the
+trained q network how good the positions at the end of the search are
+the tree is grown one level at a time and every position on the newest level is scored in one
+batched forward pass, so a level costs one network call no matter how many positions it has
+it keeps adding levels until max_depth or the per-move time budget is reached
+"""
+class HybridAgent(SearchAgent):
+    def __init__(self, q_agent, time_budget_ms=100, max_depth=4, player=None, rows=6, cols=7):
+        super().__init__(time_budget_ms, max_depth, player, rows, cols)
+        self.q_agent = q_agent
+
+    """
+    search(self, player, valid_moves) grows the tree level by level from the current self.board
+    player is the player to move
+    returns the best move from the deepest level that was scored in time
+    """
+    def search(self, player, valid_moves):
+        self.deadline = time.perf_counter() + self.time_budget_ms / 1000
+        self.nodes = 0
+        self.last_depth = 0
+        ordered = [col for col in self.move_order if col in valid_moves]
+        for col in ordered:
+            if self._wins(col, player):
+                return col
+        network = self.q_agent.get_inference()
+        start = time.perf_counter()
+        # a node is [board, player to move, parent index, move, final value if the game is over, network score]
+        levels = [[[self.board.copy(), player, None, None, None, None]]]
+        best_move = ordered[0]
+        for depth in range(1, self.max_depth + 1):
+            try:
+                levels.append(self._expand(levels[-1]))
+            except TimeoutError:
+                break
+            if time.perf_counter() > self.deadline:
+                break  # no time left to score the new level
+            self._score_frontier(levels[-1], network)
+            best_move = self._back_up(levels)
+            self.last_depth = depth
+            now = time.perf_counter()
+            # the next level is about cols times bigger, so don't start it if it can't finish in time
+            if now + (now - start) * self.board.cols > self.deadline:
+                break
+        return best_move
+
+    """
+    _expand(self, level) makes the next level of the tree from every unfinished node in level
+    raises TimeoutError if the time budget runs out part way through
+    """
+    def _expand(self, level):
+        children = []
+        for index, (board, player, _, _, value, _) in enumerate(level):
+            if value is not None:
+                continue  # the game is already over here
+            for col in self.move_order:
+                if not board.is_valid_move(col):
+                    continue
+                child = board.copy()
+                child.make_move(col, player)
+                self.nodes += 1
+                if child.check_winner(player):
+                    # the player to move in the child has just lost
+                    child_value = -(WIN_SCORE - child.moves_played)
+                elif child.is_full():
+                    child_value = 0
+                else:
+                    child_value = None
+                children.append([child, 3 - player, index, col, child_value, None])
+            if time.perf_counter() > self.deadline:
+                raise TimeoutError()
+        return children
+
+    """
+    _score_frontier(self, level, network) scores every unfinished node on the newest level with one forward pass
+    the score is the best q value over the valid moves, for the player to move
+    boards are shown to the network from the player to move's side (their pieces as 1),
+    the same way it sees the board when it plays as player 1
+    """
+    def _score_frontier(self, level, network):
+        unfinished = [node for node in level if node[4] is None]
+        if not unfinished:
+            return
+        # build every board straight from the bitboards instead of one get_board_state() at a time
+        bitboards = np.array([node[0].bitboards for node in unfinished], dtype=np.uint64)
+        players = np.array([node[1] for node in unfinished])
+        mine = bitboards[np.arange(len(unfinished)), players - 1]
+        theirs = bitboards[np.arange(len(unfinished)), 2 - players]
+        cell_bits = self.board.cell_bits.flatten()
+        mine = (mine[:, None] & cell_bits) != 0
+        theirs = (theirs[:, None] & cell_bits) != 0
+        states = mine.astype(np.int8) + 2 * theirs.astype(np.int8)
+        q_values = network.predict(states)
+        q_values[states[:, :self.board.cols] != 0] = -np.inf  # a full column (top row taken) can't be played
+        for node, q in zip(unfinished, q_values.max(axis=1)):
+            node[5] = float(q)
+
+    """
+    _back_up(self, levels) works the scores back up the tree with negamax and returns the best root move
+    """
+    def _back_up(self, levels):
+        values = [node[4] if node[4] is not None else node[5] for node in levels[-1]]
+        for depth in range(len(levels) - 2, -1, -1):
+            best = [None] * len(levels[depth])  # (value, move) of each node's best child
+            for child, child_value in zip(levels[depth + 1], values):
+                parent = child[2]
+                if best[parent] is None or -child_value > best[parent][0]:
+                    best[parent] = (-child_value, child[3])
+            values = [entry[0] if entry is not None else (node[4] if node[4] is not None else node[5])
+                      for node, entry in zip(levels[depth], best)]
+        return best[0][1]
@@ -0,0 +1,52 @@
+import numpy as np
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+}
+
+"""
+NumpyInference class
+runs the q network's forward pass with plain numpy matmuls
+keras predict has several milliseconds of overhead per call, which is far more than the math
+for a small Dense network, so anything that only needs q values (playing, evaluating) uses this
+it holds a copy of the weights, so it has to be rebuilt when the network is trained
+"""
+class NumpyInference:
+    def __init__(self, weights, activations=None):
+        self.kernels = [np.asarray(w, dtype=np.float32) for w in weights[0::2]]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in weights[1::2]]
+        if activations is None:
+            # the shape _build_model uses: relu on every layer except the output
+            activations = ['relu'] * (len(self.kernels) - 1) + ['linear']
+        self.activation_names = list(activations)
+        self.activations = [ACTIVATIONS[name] for name in activations]
+
+    """
+    predict(self, states) returns the q values for one state (shape (7,)) or a batch (shape (N, 7))
+    states is one flattened board or an (N, 42) array of them
+    """
+    def predict(self, states):
+        x = np.asarray(states, dtype=np.float32)
+        single = x.ndim == 1
+        x = x.reshape(1, -1) if single else x.reshape(len(x), -1)
+        for kernel, bias, activation in zip(self.kernels, self.biases, self.activations):
+            x = activation(x @ kernel + bias)
+        return x[0] if single else x
+
+
+"""
+inference_from_model(model) builds a NumpyInference from a keras model made only of Dense layers
+"""
+def inference_from_model(model):
+    weights = []
+    activations = []
+    for layer in model.layers:
+        config = layer.get_config()
+        if 'activation' not in config or len(layer.get_weights()) != 2:
+            raise ValueError(f"NumpyInference only supports Dense layers, not {layer.__class__.__name__}")
+        weights.extend(layer.get_weights())
+        activations.append(config['activation'])
+    return NumpyInference(weights, activations)
@@ -0,0 +1,227 @@
+import math
+import random
+import time
+import numpy as np
+from game.board import Connect4Board
+from game.batch_env import BatchConnect4Env
+from game.turns import player_to_move
+
+"""
+MCTSNode is one position in the monte carlo search tree
+player is the player who made the move into this position, and wins are counted for them
+(1 for a win, 0.5 for a draw), so a parent picks the child that is best for the player to move
+"""
+class MCTSNode:
+    def __init__(self, parent, move, player, position_hash, valid_moves, result=None):
+        self.parent = parent
+        self.move = move
+        self.player = player
+        self.hash = position_hash
+        self.children = []
+        self.untried = list(valid_moves)  # moves that don't have a child node yet
+        self.result = result  # the value for player if the game is over here, None if it isn't
+        self.visits = 0
+        self.wins = 0.0
+
+    """
+    best_child(self, exploration) picks the child with the highest UCT score
+    """
+    def best_child(self, exploration):
+        log_visits = math.log(self.visits)
+        return max(self.children,
+                   key=lambda child: child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits))
+
+
+"""
+This is the MCTSAgent class
+it picks moves with monte carlo tree search: UCT selection through a tree of positions and random
+playouts to the end of the game from each new leaf
+the playouts for a whole batch of leaves run together in a BatchConnect4Env, so one numpy step
+moves every playout forward at once instead of playing the games one at a time in python
+the leaves in a batch are spread out by counting their visits as soon as they are picked (virtual loss)
+the search stops after max_simulations playouts or time_budget_ms, whichever comes first (None turns one off)
+the part of the tree under the position actually reached is kept for the next move
+it has the same act(state, valid_moves) as QAgent so it can be used anywhere a QAgent plays
+"""
+class MCTSAgent:
+    def __init__(self, time_budget_ms=500, max_simulations=None, batch_size=64, exploration=1.4,
+                 player=None, rows=6, cols=7, seed=None):
+        self.time_budget_ms = time_budget_ms
+        self.max_simulations = max_simulations
+        self.batch_size = batch_size
+        self.exploration = exploration
+        self.player = player  # which player this agent is, used when it can't be told from the board
+        self.epsilon = 0
+        self.board = Connect4Board(rows, cols)
+        self.env = BatchConnect4Env(batch_size, rows, cols, auto_reset=False)
+        self.rng = np.random.default_rng(seed)
+        self.random = random.Random(seed)
+        self.root = None
+        self.simulations = 0  # playouts run on the last move
+        self.reused_visits = 0  # playouts kept from earlier moves by tree reuse
+        self.sims_per_second = 0.0
+
+    """
+    act(self, state, valid_moves) picks the most visited move after searching within the budget
+    state is the state of the board
+    valid_moves is the list of valid moves
+    position_hash is the zobrist hash of state, it is worked out if not given
+    """
+    def act(self, state, valid_moves, position_hash=None, mirror_hash=None):
+        self.board.set_state(state)
+        if position_hash is None:
+            position_hash = self.board.hash
+        player = player_to_move(state, self.player or 1)
+        self.root = self._find_root(position_hash)
+        if self.root is None:
+            self.root = MCTSNode(None, None, 3 - player, position_hash, valid_moves)
+        self.reused_visits = self.root.visits
+        self.search()
+        best = max(self.root.children, key=lambda child: child.visits)
+        # keep the tree under the chosen move, the opponent's reply will be one of its children
+        self.root = best
+        best.parent = None
+        return best.move
+
+    """
+    _find_root(self, position_hash) looks for the position in the tree kept from the last move
+    returns the node for it, or None if it isn't there (a new game, or the tree was never built)
+    """
+    def _find_root(self, position_hash):
+        if self.root is None:
+            return None
+        if self.root.hash == position_hash:
+            return self.root
+        for child in self.root.children:
+            if child.hash == position_hash:
+                child.parent = None
+                return child
+        return None
+
+    """
+    search(self) runs simulations from self.root until the budget is used up
+    """
+    def search(self):
+        start = time.perf_counter()
+        deadline = None if self.time_budget_ms is None else start + self.time_budget_ms / 1000
+        max_simulations = self.max_simulations
+        if max_simulations is None and deadline is None:
+            max_simulations = 1000  # never search forever
+        self.simulations = 0
+        while True:
+            if max_simulations is not None and self.simulations >= max_simulations:
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            batch_size = self.batch_size
+            if max_simulations is not None:
+                batch_size = min(batch_size, max_simulations - self.simulations)
+            self._run_batch(batch_size)
+            self.simulations += batch_size
+        elapsed = time.perf_counter() - start
+        self.sims_per_second = self.simulations / elapsed if elapsed > 0 else 0.0
+
+    """
+    _run_batch(self, batch_size) picks batch_size leaves, plays them all out at once and backs up the results
+    """
+    def _run_batch(self, batch_size):
+        paths = []
+        states = []
+        players = []
+        for _ in range(batch_size):
+            path = self._select_and_expand()
+            leaf = path[-1]
+            if leaf.result is not None:
+                self._back_up(path, leaf.player if leaf.result == 1 else 0)
+            else:
+                paths.append(path)
+                states.append(self._leaf_state(path))
+                players.append(3 - leaf.player)
+        if paths:
+            winners = self._rollouts(np.array(states), np.array(players))
+            for path, winner in zip(paths, winners):
+                self._back_up(path, winner)
+
+    """
+    _select_and_expand(self) walks down the tree with UCT and adds one new node at the end
+    every node on the way gets its visit counted straight away so the next walk in the batch
+    is pushed somewhere else
+    returns the list of nodes from the root to the new leaf
+    """
+    def _select_and_expand(self):
+        node = self.root
+        node.visits += 1
+        path = [node]
+        moves = []
+        while node.result is None and not node.untried and node.children:
+            node = node.best_child(self.exploration)
+            node.visits += 1
+            path.append(node)
+            self.board.make_move(node.move, node.player)
+            moves.append(node.move)
+        if node.result is None and node.untried:
+            move = node.untried.pop(self.random.randrange(len(node.untried)))
+            player = 3 - node.player
+            row = self.board.make_move(move, player)
+            moves.append(move)
+            if self.board.check_winner(player, row, move):
+                result = 1
+            elif self.board.is_full():
+                result = 0.5
+            else:
+                result = None
+            valid_moves = [] if result is not None else self.board.get_valid_moves()
+            child = MCTSNode(node, move, player, self.board.hash, valid_moves, result)
+            child.visits = 1
+            node.children.append(child)
+            path.append(child)
+        for move in reversed(moves):
+            self.board.undo_move(move)
+        return path
+
+    """
+    _leaf_state(self, path) returns the flattened board at the end of path
+    """
+    def _leaf_state(self, path):
+        for node in path[1:]:
+            self.board.make_move(node.move, node.player)
+        state = self.board.get_board_state()
+        for node in reversed(path[1:]):
+            self.board.undo_move(node.move)
+        return state
+
+    """
+    _rollouts(self, states, players) plays random moves in every game until they are all over
+    states is an (N, rows * cols) array of boards, players is the player to move in each
+    returns the winner of each game (0 for a draw)
+    """
+    def _rollouts(self, states, players):
+        count = len(states)
+        padded = np.zeros((self.env.num_envs, states.shape[1]), dtype=np.int8)
+        padded[:count] = states
+        padded_players = np.ones(self.env.num_envs, dtype=np.int8)
+        padded_players[:count] = players
+        self.env.set_states(padded, padded_players)
+        winners = np.zeros(self.env.num_envs, dtype=np.int8)
+        active = np.zeros(self.env.num_envs, dtype=bool)
+        active[:count] = True
+        while active.any():
+            # a random valid column for every game: the highest random score among the valid ones
+            scores = self.rng.random((self.env.num_envs, self.env.cols))
+            scores[~self.env.valid_move_mask()] = -1
+            _, step_winners, dones = self.env.step(scores.argmax(axis=1), active)
+            winners[dones] = step_winners[dones]
+            active &= ~dones
+        return winners[:count]
+
+    """
+    _back_up(self, path, winner) adds the result of one simulation to every node on path
+    winner is 1 or 2, or 0 for a draw
+    the visits were already counted on the way down
+    """
+    def _back_up(self, path, winner):
+        for node in path:
+            if winner == 0:
+                node.wins += 0.5
+            elif winner == node.player:
+                node.wins += 1
@@ -0,0 +1,61 @@
+from collections import deque
+
+"""
+NStepAccumulator class
+sits between a training loop and agent.remember and turns one-move transitions into n-step ones
+instead of (state, action, reward, next_state) it stores
+    (state, action, reward + gamma * reward_1 + ... + gamma^(n-1) * reward_(n-1), next_state_(n-1))
+so replay bootstraps from n moves later (with gamma^n) and a win or loss reaches the moves that led
+to it in far fewer gradient steps than with one-move transitions
+when the game ends every transition still waiting is stored with the rewards up to the end and done set,
+so nothing bootstraps past the end of a game
+with n = 1 every transition is passed straight through, the same as calling remember
+"""
+class NStepAccumulator:
+    def __init__(self, remember, n=3, gamma=0.95):
+        self.remember = remember  # where finished transitions go, usually agent.remember
+        self.n = n
+        self.gamma = gamma
+        self.pending = deque()  # (state, action, reward, next_state) not stored yet, oldest first
+
+    """
+    add(self, state, action, reward, next_state, done) takes one move's transition from the training loop
+    """
+    def add(self, state, action, reward, next_state, done):
+        self.pending.append((state, action, reward, next_state))
+        if done:
+            self._flush(next_state)
+        elif len(self.pending) >= self.n:
+            self._store_oldest(next_state, False)
+
+    """
+    end_episode() has to be called when a game is over, it stores whatever is still waiting
+    games that end without a done transition (a draw) still end here, so those are stored as done too
+    """
+    def end_episode(self):
+        if self.pending:
+            self._flush(self.pending[-1][3])
+
+    """
+    reset() drops anything waiting without storing it (for a game that was abandoned)
+    """
+    def reset(self):
+        self.pending.clear()
+
+    """
+    _flush(self, last_state) stores every waiting transition as ending the game at last_state
+    """
+    def _flush(self, last_state):
+        while self.pending:
+            self._store_oldest(last_state, True)
+
+    """
+    _store_oldest(self, next_state, done) stores the oldest waiting transition with the discounted
+    rewards of every move after it that is waiting too
+    """
+    def _store_oldest(self, next_state, done):
+        n_step_return = 0.0
+        for i, (_, _, reward, _) in enumerate(self.pending):
+            n_step_return += self.gamma ** i * reward
+        state, action, _, _ = self.pending.popleft()
+        self.remember(state, action, n_step_return, next_state, done)
@@ -0,0 +1,142 @@
+import argparse
+import os
+import time
+import numpy as np
+from ai.search_agent import SearchAgent
+from game.bitboard import Connect4Bitboard
+from game.symmetry import canonical_hash, mirror_action
+from utils.async_writer import atomic_path, replace_atomic
+
+BOOK_DTYPE = np.dtype([('key', '<u8'), ('move', 'u1')])
+DEFAULT_BOOK_PATH = "models/opening_book.npy"
+# xored into the key when player 2 is to move, the same pieces can be on the board with either
+# player to move (depending on who went first) and the best move is different for each
+SIDE_TO_MOVE_KEY = 0x9E3779B97F4A7C15
+
+"""
+opening_book builds and reads a table of precomputed moves for the start of the game
+every position in the first few plies is searched once offline, and the best move is stored
+under the position's canonical hash and the player to move (a position and its mirror image share one entry)
+the book covers games started by either player
+the book is a .npy file of (key, move) records sorted by key, so it can be memory-mapped
+and binary searched when a game starts instead of being read into memory
+build one from the project folder with: python -m ai.opening_book --plies 6
+"""
+
+"""
+OpeningBook class
+looks up moves in a book file made by build_opening_book
+"""
+class OpeningBook:
+    def __init__(self, path=DEFAULT_BOOK_PATH, cols=7):
+        self.path = path
+        self.cols = cols
+        # only the header is read here, the records are paged in by the os as lookups touch them
+        self.entries = np.load(path, mmap_mode='r')
+        self.keys = self.entries['key']
+
+    """
+    lookup(self, position_hash, mirror_hash, player) returns the book move for a position,
+    or None if it isn't in the book
+    position_hash and mirror_hash are the board's zobrist hashes (board.hash and board.mirror_hash)
+    player is the player to move
+    """
+    def lookup(self, position_hash, mirror_hash, player=1):
+        key, flipped = book_key(position_hash, mirror_hash, player)
+        index = int(np.searchsorted(self.keys, np.uint64(key)))
+        if index == len(self.keys) or int(self.keys[index]) != key:
+            return None
+        move = int(self.entries['move'][index])
+        return mirror_action(move, self.cols) if flipped else move
+
+    def __len__(self):
+        return len(self.keys)
+
+
+"""
+book_key(position_hash, mirror_hash, player) is the key a position is stored under in the book
+returns (key, flipped) like canonical_hash, with the side to move mixed into the key
+"""
+def book_key(position_hash, mirror_hash, player):
+    key, flipped = canonical_hash(position_hash, mirror_hash)
+    if player == 2:
+        key ^= SIDE_TO_MOVE_KEY
+    return key, flipped
+
+
+"""
+load_opening_book(path) opens the book at path, returns None if there is no book there
+"""
+def load_opening_book(path=DEFAULT_BOOK_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        return OpeningBook(path)
+    except Exception as e:
+        print(f"Error loading opening book: {e}")
+        return None
+
+
+"""
+opening_positions(plies) finds every position with fewer than plies pieces that isn't already over,
+in games started by player 1 and in games started by player 2
+returns a list of (key, flipped, board, player) with one entry per position and mirror image pair
+for each player to move
+"""
+def opening_positions(plies):
+    positions = {}
+    for first_player in (1, 2):
+        level = [Connect4Bitboard()]
+        for ply in range(plies):
+            player = first_player if ply % 2 == 0 else 3 - first_player
+            next_level = []
+            for board in level:
+                key, flipped = book_key(board.hash, board.mirror_hash, player)
+                if key in positions:
+                    continue
+                positions[key] = (flipped, board, player)
+                for col in board.get_valid_moves():
+                    child = board.copy()
+                    child.make_move(col, player)
+                    if not child.check_winner(player) and not child.is_full():
+                        next_level.append(child)
+            level = next_level
+    return [(key, flipped, board, player) for key, (flipped, board, player) in positions.items()]
+
+
+"""
+build_opening_book(path, plies, time_budget_ms) searches every opening position and writes the book
+path is where the book is saved
+plies is how many moves into the game the book covers
+time_budget_ms is how long the search agent gets for each position
+"""
+def build_opening_book(path=DEFAULT_BOOK_PATH, plies=6, time_budget_ms=200):
+    positions = opening_positions(plies)
+    agent = SearchAgent(time_budget_ms=time_budget_ms)
+    entries = np.zeros(len(positions), dtype=BOOK_DTYPE)
+    start = time.perf_counter()
+    for i, (key, flipped, board, player) in enumerate(positions):
+        agent.board.set_state(board.get_board_state())
+        move = agent.search(player, board.get_valid_moves())
+        entries[i] = (key, mirror_action(move, board.cols) if flipped else move)
+        if (i + 1) % 100 == 0:
+            print(f"{i + 1}/{len(positions)} positions searched ({time.perf_counter() - start:.0f}s)")
+    entries.sort(order='key')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    np.save(atomic_path(path), entries)
+    replace_atomic(path)
+    print(f"Saved an opening book of {len(entries)} positions to {path}")
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the opening book with the search agent.')
+    parser.add_argument('--plies', type=int, default=6, help='how many moves into the game the book covers')
+    parser.add_argument('--time-ms', type=int, default=200, help='search time for each position')
+    parser.add_argument('--output', default=DEFAULT_BOOK_PATH, help='where to save the book')
+    args = parser.parse_args(argv)
+    build_opening_book(args.output, args.plies, args.time_ms)
+
+
+if __name__ == '__main__':
+    main()
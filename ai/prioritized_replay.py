@@ -0,0 +1,162 @@
+import os
+import numpy as np
+from ai.replay_buffer import ReplayBuffer
+
+"""
+SumTree class
+a binary tree kept in one array where every parent holds the sum of its two children
+the leaves are the priorities of the transitions, so the root is the total priority and
+finding the transition at a point along the running total takes one walk down the tree (O(log n))
+tree[1] is the root, tree[i]'s children are tree[2i] and tree[2i + 1],
+and the leaves start at tree[leaf_start] (tree[0] is not used)
+"""
+class SumTree:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.depth = max(1, int(np.ceil(np.log2(capacity))))
+        self.leaf_start = 1 << self.depth
+        self.tree = np.zeros(2 * self.leaf_start, dtype=np.float64)
+
+    """
+    total() returns the sum of every priority
+    """
+    def total(self):
+        return self.tree[1]
+
+    """
+    update(self, indices, priorities) sets the priorities of some transitions and fixes the sums above them
+    indices and priorities are arrays (or single values)
+    """
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices, dtype=np.int64).reshape(-1) + self.leaf_start
+        self.tree[nodes] = np.asarray(priorities, dtype=np.float64).reshape(-1)
+        for _ in range(self.depth):
+            # every parent is worked out again from both children, so repeated parents are fine
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    """
+    find(self, values) walks down the tree for every value in values
+    returns the index of the transition whose share of the running total each value falls in
+    """
+    def find(self, values):
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = self.tree[2 * nodes]
+            go_right = values >= left
+            values -= left * go_right
+            nodes = 2 * nodes + go_right
+        return nodes - self.leaf_start
+
+    """
+    get(self, indices) returns the priorities of some transitions
+    """
+    def get(self, indices):
+        return self.tree[np.asarray(indices, dtype=np.int64) + self.leaf_start]
+
+    """
+    clear() sets every priority back to 0
+    """
+    def clear(self):
+        self.tree[:] = 0
+
+
+"""
+This is the PrioritizedReplayBuffer class
+a ReplayBuffer that samples transitions in proportion to how wrong the network was about them
+(their td error) instead of uniformly, so the rare wins and losses with a big reward are seen
+much more often than the many ordinary moves
+a transition's priority is (|td error| + min_priority) ** alpha, new transitions get the highest
+priority so far so they are trained on at least once
+because the samples are no longer uniform, sample_with_weights also returns importance sampling
+weights that scale each transition's loss back, beta goes from its start value up to 1 over training
+"""
+class PrioritizedReplayBuffer(ReplayBuffer):
+    def __init__(self, capacity=2000, state_size=42, alpha=0.6, beta=0.4, beta_increment=0.0001,
+                 min_priority=0.01):
+        super().__init__(capacity, state_size)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment  # added to beta on every sample
+        self.min_priority = min_priority  # keeps transitions with no error from never being picked
+        self.tree = SumTree(capacity)
+        self.max_priority = 1.0  # highest |td error| + min_priority seen, given to new transitions
+
+    """
+    append(self, transition) adds a transition with the highest priority so far
+    """
+    def append(self, transition):
+        index = self.position
+        super().append(transition)
+        self.tree.update(index, self.max_priority ** self.alpha)
+
+    """
+    sample(self, batch_size) picks batch_size transitions by priority
+    returns (states, actions, rewards, next_states, dones) as arrays like ReplayBuffer.sample
+    """
+    def sample(self, batch_size):
+        return self.sample_with_weights(batch_size)[0]
+
+    """
+    sample_with_weights(self, batch_size) picks batch_size transitions by priority
+    the running total is split into batch_size equal parts and one transition is picked from each,
+    which spreads the batch out more than batch_size fully random picks
+    returns (batch, indices, weights), pass indices back to update_priorities after training
+    """
+    def sample_with_weights(self, batch_size):
+        total = self.tree.total()
+        segment = total / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        indices = np.minimum(self.tree.find(np.minimum(values, total * (1 - 1e-12))), self.size - 1)
+        probabilities = self.tree.get(indices) / total
+        weights = (self.size * probabilities) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        batch = (self.states[indices], self.actions[indices], self.rewards[indices],
+                 self.next_states[indices], self.dones[indices])
+        return batch, indices, weights.astype(np.float32)
+
+    """
+    update_priorities(self, indices, td_errors) sets the priorities of sampled transitions from their new td errors
+    """
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(np.asarray(td_errors, dtype=np.float64)) + self.min_priority
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities ** self.alpha)
+
+    """
+    clear() empties the buffer and the priorities
+    """
+    def clear(self):
+        super().clear()
+        self.tree.clear()
+        self.max_priority = 1.0
+
+    """
+    get_state(self) is ReplayBuffer.get_state with the priorities (oldest first), max_priority and beta added
+    so a resumed run samples exactly like the one that was stopped
+    """
+    def get_state(self):
+        state = super().get_state()
+        state['priorities'] = self.tree.get(self._ordered_indices())
+        state['max_priority'] = np.array(self.max_priority)
+        state['beta'] = np.array(self.beta)
+        return state
+
+    """
+    load(self, directory) loads saved transitions and their priorities
+    transitions saved without priorities (by a plain ReplayBuffer) all start at the highest priority
+    """
+    def load(self, directory):
+        super().load(directory)
+        self.tree.clear()
+        priorities_path = os.path.join(directory, 'priorities.npy')
+        if os.path.exists(priorities_path):
+            priorities = np.load(priorities_path)
+            # load keeps the newest transitions when there were more than the capacity
+            self.tree.update(np.arange(self.size), priorities[len(priorities) - self.size:])
+            self.max_priority = float(np.load(os.path.join(directory, 'max_priority.npy')))
+            self.beta = float(np.load(os.path.join(directory, 'beta.npy')))
+        else:
+            self.tree.update(np.arange(self.size), np.full(self.size, self.max_priority ** self.alpha))
@@ -1,30 +1,85 @@
 import numpy as np
 import random
 import os
-import tensorflow as tf
-from tensorflow import keras
-from collections import deque
+from collections import OrderedDict
+from ai.replay_buffer import ReplayBuffer
+from ai.prioritized_replay import PrioritizedReplayBuffer
+from ai.inference import inference_from_model
+from game.zobrist import zobrist_hash
+from game.symmetry import mirror_state, mirror_action, canonical_hash
+from game.turns import player_to_move
 
 """This is the QAgent class
 It defines the methods for my QAgent"""
 class QAgent:
-    def __init__(self, state_size=42, action_size=7, learning_rate=0.001):
+    def __init__(self, state_size=42, action_size=7, learning_rate=0.001, memory_size=2000,
+                 mirror_augment=False, prioritized=False, n_step=1):
         self.state_size = state_size  # 6x7 board flattened
         self.action_size = action_size  # 7 possible columns
         self.learning_rate = learning_rate
         self.epsilon = 1.00  # exploration rate
         self.epsilon_min = 0.01
         self.epsilon_decay = 0.995
-        self.memory = deque(maxlen=2000)
-        self.q_network = self._build_model()
-        self.target_network = self._build_model()
+        self.gamma = 0.95  # discount for future rewards
+        # moves per stored transition (see NStepAccumulator), replay bootstraps with gamma ** n_step
+        self.n_step = n_step
+        # also learn from the mirror image of every transition (the board is left/right symmetric)
+        self.mirror_augment = mirror_augment
+        # prioritized replay samples the transitions the network gets most wrong more often
+        if prioritized:
+            self.memory = PrioritizedReplayBuffer(memory_size, state_size)
+        else:
+            self.memory = ReplayBuffer(memory_size, state_size)
+        # the networks (and tensorflow) are only loaded the first time they are used,
+        # so making an agent is instant when it is only used for browsing models
+        self._q_network = None
+        self._target_network = None
+        self._train_function = None  # compiled train step, built the first time replay runs
+        self.double_dqn = True  # pick the next move with q_network but score it with target_network
+        self.inference = None  # numpy copy of q_network for playing, built when first needed
+        self.q_cache = OrderedDict()  # position hash -> q values, least recently used first
+        self.q_cache_size = 100000
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.opening_book = None  # an OpeningBook to take the first moves from, if one is set
+        self.player = None  # which player this agent is, used for the book when it can't be told from the board
         self.total_episodes = 0
+        self.moves_remembered = 0  # calls to remember, the mirror images are not counted
         self.models_dir = "models/saved_models"
 
+    """
+    q_network is the network that is trained and used to pick moves, built when first used
+    """
+    @property
+    def q_network(self):
+        if self._q_network is None:
+            self._q_network = self._build_model()
+        return self._q_network
+
+    @q_network.setter
+    def q_network(self, model):
+        self._q_network = model
+        self._train_function = None  # the compiled step belongs to the old model
+
+    """
+    target_network is the network used for the future reward in replay, built when first used
+    """
+    @property
+    def target_network(self):
+        if self._target_network is None:
+            self._target_network = self._build_model()
+        return self._target_network
+
+    @target_network.setter
+    def target_network(self, model):
+        self._target_network = model
+        self._train_function = None
+
     """
     _build_model(self) builds the model that will be used to train the ai
     """
     def _build_model(self):
+        from tensorflow import keras
         model = keras.Sequential()
         model.add(keras.layers.Dense(128, input_shape=(self.state_size,), activation='relu'))
         model.add(keras.layers.Dense(128, activation='relu'))
@@ -39,69 +94,205 @@ class QAgent:
     reward is how good the model did
     next_state is the next state of the board
     done is whether the game is over
+    with mirror_augment on the mirror image of the transition is remembered too
     """
     def remember(self, state, action, reward, next_state, done):
+        self.moves_remembered += 1
         self.memory.append((state, action, reward, next_state, done))
+        if self.mirror_augment:
+            self.memory.append((mirror_state(state), mirror_action(action, self.action_size), reward,
+                                mirror_state(next_state), done))
 
     """
-    act(self, state, valid_moves) acts based on valid moves and how much randomness is used.
+    act(self, state, valid_moves, position_hash, mirror_hash) acts based on valid moves and how much randomness is used.
     state is the state of the board
     valid_moves is the list of valid moves
+    position_hash and mirror_hash are the board's zobrist hashes (board.hash and board.mirror_hash),
+    they are worked out from state if not given
+    positions in the opening book (if one is set) are answered from the book without the network
     """
-    def act(self, state, valid_moves):
+    def act(self, state, valid_moves, position_hash=None, mirror_hash=None):
         if random.random() <= self.epsilon:
             return random.choice(valid_moves)
         else:
-            q_values = self.q_network.predict(state.reshape(1, -1))[0]
-            for move in valid_moves:
-                valid_q_values = [(move, q_values[move])]
-            return max(valid_q_values, key=lambda x: x[1])[0]
+            if self.opening_book is not None:
+                if position_hash is None:
+                    position_hash = zobrist_hash(state)
+                if mirror_hash is None:
+                    mirror_hash = zobrist_hash(mirror_state(state))
+                player = player_to_move(state, self.player or 1)
+                move = self.opening_book.lookup(position_hash, mirror_hash, player)
+                if move in valid_moves:
+                    return move
+            q_values = self.get_q_values(state, position_hash, mirror_hash)
+            return max(valid_moves, key=lambda move: q_values[move])
+
+    """
+    get_q_values(self, state, position_hash, mirror_hash) returns the q values for one board
+    while the weights stay the same (like when playing against a person) positions come up again and again,
+    especially early in the game, so the q values are cached by position hash
+    the cache is emptied whenever the weights change, so it does nothing during training, and act_batch doesn't use it
+    with mirror_augment on a position and its mirror image share one cache entry
+    """
+    def get_q_values(self, state, position_hash=None, mirror_hash=None):
+        if position_hash is None:
+            position_hash = zobrist_hash(state)
+        key, flipped = position_hash, False
+        if self.mirror_augment:
+            if mirror_hash is None:
+                mirror_hash = zobrist_hash(mirror_state(state))
+            key, flipped = canonical_hash(position_hash, mirror_hash)
+        q_values = self.q_cache.get(key)
+        if q_values is not None:
+            self.cache_hits += 1
+            self.q_cache.move_to_end(key)
+        else:
+            self.cache_misses += 1
+            q_values = self.get_inference().predict(mirror_state(state) if flipped else state)
+            self.q_cache[key] = q_values
+            if len(self.q_cache) > self.q_cache_size:
+                self.q_cache.popitem(last=False)
+        # cached q values are for the canonical side, so flip them back for a mirrored position
+        return q_values[::-1] if flipped else q_values
+
+    """
+    cache_hit_rate() returns the fraction of q value lookups that were answered by the cache
+    """
+    def cache_hit_rate(self):
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.0
+
+    """
+    act_batch(self, states, valid_mask) picks a move for every game in a batch with one forward pass
+    states is an (N, 42) array of boards (like BatchConnect4Env.get_board_states())
+    valid_mask is an (N, 7) boolean array of valid columns (like BatchConnect4Env.valid_move_mask())
+    epsilon is the exploration rate to use instead of self.epsilon (0 for no random moves)
+    """
+    def act_batch(self, states, valid_mask, epsilon=None):
+        if epsilon is None:
+            epsilon = self.epsilon
+        q_values = self.get_inference().predict(states)
+        q_values = np.where(valid_mask, q_values, -np.inf)
+        actions = np.argmax(q_values, axis=1)
+        explore = np.random.random(len(states)) <= epsilon
+        if explore.any():
+            # random valid column for each exploring game
+            random_scores = np.where(valid_mask[explore], np.random.random(valid_mask[explore].shape), -1.0)
+            actions[explore] = np.argmax(random_scores, axis=1)
+        return actions
+
+    """
+    get_inference() returns the numpy version of q_network, rebuilding it if the weights changed
+    """
+    def get_inference(self):
+        if self.inference is None:
+            self.inference = inference_from_model(self.q_network)
+        return self.inference
 
     """
-    replay(self, batch_size) replays the game to see if it has reached the target state
+    weights_updated() has to be called whenever q_network's weights change
+    so that acting does not keep using the old weights
+    """
+    def weights_updated(self):
+        self.inference = None
+        self.q_cache.clear()
+
+    """
+    replay(self, batch_size, gradient_steps) replays the game to see if it has reached the target state
     batch_size is how many games to replay
+    gradient_steps is how many minibatches to train on, all of them in one call to the compiled train step
+    returns the average loss, or None if there isn't enough memory yet
     """
-    def replay(self, batch_size=32):
+    def replay(self, batch_size=32, gradient_steps=1):
         if len(self.memory) < batch_size:
-            return
-        batch = random.sample(self.memory, batch_size)
-        states = []
-        targets = []
-        for state, action, reward, next_state, done in batch:
-            state = state.reshape(1, -1)
-            next_state = next_state.reshape(1, -1)
-            target = self.q_network.predict(state)[0]
-            if done:
-                target[action] = reward
-            else:
-                next_q_values = self.target_network.predict(next_state)[0]
-                target[action] = reward + 0.95 * np.max(next_q_values)
-            states.append(state[0])
-            targets.append(target)
-        self.q_network.fit(np.array(states), np.array(targets), epochs=1, verbose=0)
+            return None
+        samples = [self.memory.sample_with_weights(batch_size) for _ in range(gradient_steps)]
+        batches, indices, weights = zip(*samples)
+        states, actions, rewards, next_states, dones = [np.stack(field) for field in zip(*batches)]
+        loss, td_errors = self.get_train_function()(
+            states.astype(np.float32), actions.astype(np.int32), rewards.astype(np.float32),
+            next_states.astype(np.float32), dones.astype(np.float32), np.stack(weights))
+        self.memory.update_priorities(np.concatenate(indices), td_errors.numpy().reshape(-1))
+        self.weights_updated()
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
+        return float(loss)
+
+    """
+    get_train_function() returns the compiled train step, building it the first time
+    keras fit sets up callbacks, a data adapter and an iterator on every call, which costs far more
+    than the math for a network this small, so replay runs its own tf.function instead
+    it uses q_network's own optimizer, so the adam state carries on between calls (and into checkpoints)
+    """
+    def get_train_function(self):
+        if self._train_function is None:
+            self._train_function = self._build_train_function()
+        return self._train_function
+
+    """
+    _build_train_function(self) compiles the train step for the current networks
+    the step takes (steps, batch_size, ...) arrays and does one gradient step per minibatch
+    the targets are worked out inside the step with one forward pass over the next states per network
+    weights scales each transition's loss (the importance sampling weights of prioritized replay)
+    it returns (average loss, td errors of every transition)
+    """
+    def _build_train_function(self):
+        import tensorflow as tf
+        q_network = self.q_network
+        target_network = self.target_network
+        optimizer = q_network.optimizer
+        gamma = self.gamma ** self.n_step
+        action_size = self.action_size
+        double_dqn = self.double_dqn
+
+        @tf.function
+        def train_step(states, actions, rewards, next_states, dones, weights):
+            next_q_values = target_network(next_states, training=False)
+            if double_dqn:
+                # q_network picks the best next move and target_network says what it is worth,
+                # which stops the max over noisy q values from overestimating
+                next_actions = tf.argmax(q_network(next_states, training=False), axis=1, output_type=tf.int32)
+                next_values = tf.gather(next_q_values, next_actions, batch_dims=1)
+            else:
+                next_values = tf.reduce_max(next_q_values, axis=1)
+            targets = rewards + gamma * next_values * (1.0 - dones)
+            with tf.GradientTape() as tape:
+                q_values = tf.gather(q_network(states, training=True), actions, batch_dims=1)
+                td_errors = targets - q_values
+                # the same as the mse fit used to minimise: only the chosen move's q value had a
+                # target different from the network's own output, and the error was averaged over every move
+                loss = tf.reduce_mean(weights * tf.square(td_errors)) / action_size
+            gradients = tape.gradient(loss, q_network.trainable_variables)
+            optimizer.apply_gradients(zip(gradients, q_network.trainable_variables))
+            return loss, td_errors
+
+        @tf.function(reduce_retracing=True)
+        def train_steps(states, actions, rewards, next_states, dones, weights):
+            total = tf.constant(0.0)
+            steps = tf.shape(states)[0]
+            td_errors = tf.TensorArray(tf.float32, size=steps)
+            for i in tf.range(steps):
+                loss, step_td_errors = train_step(states[i], actions[i], rewards[i], next_states[i], dones[i],
+                                                  weights[i])
+                total += loss
+                td_errors = td_errors.write(i, step_td_errors)
+            return total / tf.cast(steps, tf.float32), td_errors.stack()
+
+        return train_steps
 
     """
     update_target_network() updates the target network"""
     def update_target_network(self):
         self.target_network.set_weights(self.q_network.get_weights())
+        self.weights_updated()
 
     """
-    save_model() saves the model to the designated filepath
-    it also saves the metadata
+    soft_update_target_network(self, tau) moves the target network tau of the way towards q_network
+    tau is between 0 (no change) and 1 (the same as update_target_network)
     """
-    def save_model(self, filepath):
-        if not filepath.endswith('.keras'):
-            filepath += '.keras'
-        self.q_network.save(filepath)
-        metadata = {
-            'episodes': getattr(self, 'total_episodes', 0),
-            'epsilon': getattr(self, 'epsilon', 1.0),
-            'memory': list(self.memory) if hasattr(self, 'memory') else [],
-            # Add other relevant training state information
-        }
-        return metadata
+    def soft_update_target_network(self, tau):
+        for target, source in zip(self.target_network.weights, self.q_network.weights):
+            target.assign(target * (1 - tau) + source * tau)
 
     """
     load_model() loads the model from filepath
@@ -112,8 +303,26 @@ class QAgent:
         if not filepath.endswith('.keras'):
             filepath = filepath + '.keras'
         filep = os.path.join(self.models_dir, filepath)
+        from tensorflow import keras
         self.q_network = keras.models.load_model(filep)
         self.target_network.set_weights(self.q_network.get_weights())
+        self.weights_updated()
+        # warm start the replay memory if it was saved with the model
+        memory_dir = filep[:-len('.keras')] + '_memory'
+        if os.path.isdir(memory_dir):
+            self.memory.load(memory_dir)
+
+    """
+    get_config() returns the settings that change how the agent learns
+    a checkpoint saves them so it is never resumed with a different algorithm
+    """
+    def get_config(self):
+        return {
+            'prioritized': isinstance(self.memory, PrioritizedReplayBuffer),
+            'n_step': self.n_step,
+            'mirror_augment': self.mirror_augment,
+            'double_dqn': self.double_dqn
+        }
 
     """
     get_training_stats() gets the training statistics for the trained model
@@ -123,5 +332,8 @@ class QAgent:
             'epsilon': self.epsilon,
             'memory_size': len(self.memory),
             'epsilon_min': self.epsilon_min,
-            'epsilon_decay': self.epsilon_decay
+            'epsilon_decay': self.epsilon_decay,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_hit_rate': self.cache_hit_rate()
         }
\ No newline at end of file
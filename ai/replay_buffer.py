@@ -0,0 +1,123 @@
+import os
+import numpy as np
+from utils.async_writer import write_arrays
+
+FIELDS = ['states', 'actions', 'rewards', 'next_states', 'dones']
+
+"""
+This is the ReplayBuffer class
+it replaces the deque of tuples that the agent used to remember its games
+every field is kept in its own preallocated numpy array and used as a ring buffer,
+so adding a transition is O(1) and sampling is one vectorized index lookup
+boards only ever hold 0, 1 or 2 so they are stored as int8 (42 bytes instead of 336)
+"""
+class ReplayBuffer:
+    def __init__(self, capacity=2000, state_size=42):
+        self.capacity = capacity
+        self.state_size = state_size
+        self.states = np.zeros((capacity, state_size), dtype=np.int8)
+        self.actions = np.zeros(capacity, dtype=np.uint8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_size), dtype=np.int8)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.position = 0  # where the next transition will be written
+        self.size = 0
+        self.rng = np.random.default_rng()
+
+    """
+    append(self, transition) adds one (state, action, reward, next_state, done) transition
+    once the buffer is full the oldest transition is written over (like deque(maxlen=...))
+    """
+    def append(self, transition):
+        state, action, reward, next_state, done = transition
+        i = self.position
+        self.states[i] = np.asarray(state).reshape(-1)
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = np.asarray(next_state).reshape(-1)
+        self.dones[i] = done
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    """
+    sample(self, batch_size) picks batch_size different transitions at random
+    returns (states, actions, rewards, next_states, dones) as arrays
+    """
+    def sample(self, batch_size):
+        indices = self.rng.choice(self.size, batch_size, replace=False)
+        return (self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices])
+
+    """
+    sample_with_weights(self, batch_size) is sample with the extras a prioritized buffer needs
+    returns (batch, indices, weights), every weight is 1 because every transition is equally likely here
+    """
+    def sample_with_weights(self, batch_size):
+        indices = self.rng.choice(self.size, batch_size, replace=False)
+        batch = (self.states[indices], self.actions[indices], self.rewards[indices],
+                 self.next_states[indices], self.dones[indices])
+        return batch, indices, np.ones(batch_size, dtype=np.float32)
+
+    """
+    update_priorities(self, indices, td_errors) does nothing, it is here so replay can treat
+    this buffer and PrioritizedReplayBuffer the same way
+    """
+    def update_priorities(self, indices, td_errors):
+        pass
+
+    """
+    clear() empties the buffer without reallocating it
+    """
+    def clear(self):
+        self.position = 0
+        self.size = 0
+
+    """
+    get_state(self) copies the stored transitions (oldest first) into a dictionary of arrays
+    the copy can be written out on another thread while the buffer keeps changing
+    """
+    def get_state(self):
+        order = self._ordered_indices()
+        return {
+            'states': self.states[order],
+            'actions': self.actions[order],
+            'rewards': self.rewards[order],
+            'next_states': self.next_states[order],
+            'dones': self.dones[order]
+        }
+
+    """
+    save(self, directory) saves the stored transitions as one .npy file per field in directory
+    """
+    def save(self, directory):
+        write_arrays(self.get_state(), directory)
+
+    """
+    load(self, directory) replaces the buffer contents with transitions saved by save()
+    the files are memory-mapped copy-on-write, so nothing is read from disk until it is used
+    and a full buffer of the same capacity is ready right away without copying anything
+    if there are more saved transitions than the capacity only the newest ones are kept
+    """
+    def load(self, directory):
+        data = {field: np.load(os.path.join(directory, field + '.npy'), mmap_mode='c') for field in FIELDS}
+        saved = len(data['actions'])
+        if saved == self.capacity:
+            # the saved arrays are already oldest first, so the ring starts back at 0
+            for field in FIELDS:
+                setattr(self, field, data[field])
+            self.size = saved
+        else:
+            start = max(0, saved - self.capacity)
+            for field in FIELDS:
+                getattr(self, field)[:saved - start] = data[field][start:]
+            self.size = saved - start
+        self.position = self.size % self.capacity
+
+    """
+    _ordered_indices() returns the indexes of the stored transitions from oldest to newest
+    """
+    def _ordered_indices(self):
+        return (np.arange(self.size) + self.position - self.size) % self.capacity
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,111 @@
+import time
+
+"""
+ReplaySchedule class
+decides how much training happens for the games that are played
+it sets the minibatch size, how many gradient steps are taken after each episode and how the
+target network follows q_network, instead of every mode doing one replay per episode
+there are two ways to set the gradient steps:
+    steps_per_episode is a fixed number of gradient steps after every episode
+    replay_ratio is gradient steps per move remembered, so long games get more training
+    than short ones (when it is set steps_per_episode is ignored), the mirror images added by
+    mirror_augment don't count so turning it on doesn't double the training
+the target network is either copied over every target_update_interval gradient steps (a hard sync),
+or moved polyak_tau of the way towards q_network after every gradient step (a polyak / soft sync)
+it also counts samples (moves remembered) and updates (gradient steps) per second,
+so the replay ratio that is really being reached can be checked
+"""
+class ReplaySchedule:
+    def __init__(self, batch_size=32, steps_per_episode=1, replay_ratio=None, target_update_interval=10,
+                 polyak_tau=None):
+        self.batch_size = batch_size
+        self.steps_per_episode = steps_per_episode
+        self.replay_ratio = replay_ratio
+        self.target_update_interval = target_update_interval  # gradient steps between hard syncs
+        self.polyak_tau = polyak_tau
+        self.credit = 0.0  # gradient steps earned by the replay ratio but not taken yet
+        self.steps_since_sync = 0
+        self.last_added = 0
+        self.samples = 0
+        self.updates = 0
+        self.start_time = time.perf_counter()
+
+    """
+    start(self, agent) resets the counters at the start of a training session
+    """
+    def start(self, agent):
+        self.credit = 0.0
+        self.steps_since_sync = 0
+        self.last_added = agent.moves_remembered
+        self.samples = 0
+        self.updates = 0
+        self.start_time = time.perf_counter()
+
+    """
+    after_episode(self, agent) does the training that is due after an episode
+    returns how many gradient steps were taken
+    """
+    def after_episode(self, agent):
+        added = agent.moves_remembered - self.last_added
+        self.last_added = agent.moves_remembered
+        self.samples += added
+        if self.replay_ratio is not None:
+            self.credit += added * self.replay_ratio
+            steps = int(self.credit)
+        else:
+            steps = self.steps_per_episode
+        if len(agent.memory) < self.batch_size:
+            self.credit = 0.0  # don't save up a burst of steps for when memory is full enough
+            return 0
+        if steps <= 0:
+            return 0
+        self.credit -= steps
+        agent.replay(self.batch_size, steps)
+        self.updates += steps
+        self._sync_target(agent, steps)
+        return steps
+
+    """
+    _sync_target(self, agent, steps) moves the target network after steps gradient steps
+    """
+    def _sync_target(self, agent, steps):
+        if self.polyak_tau is not None:
+            # steps soft updates in a row leave (1 - tau) ** steps of the old target weights
+            agent.soft_update_target_network(1 - (1 - self.polyak_tau) ** steps)
+            return
+        self.steps_since_sync += steps
+        if self.steps_since_sync >= self.target_update_interval:
+            agent.update_target_network()
+            self.steps_since_sync = 0
+
+    """
+    get_state(self) returns the counters that carry over between episodes, for checkpoints
+    """
+    def get_state(self):
+        return {'credit': self.credit, 'steps_since_sync': self.steps_since_sync, 'last_added': self.last_added}
+
+    """
+    set_state(self, state) puts back counters from get_state when a checkpoint is resumed
+    """
+    def set_state(self, state):
+        self.credit = state['credit']
+        self.steps_since_sync = state['steps_since_sync']
+        self.last_added = state['last_added']
+
+    """
+    rates(self) returns (samples per second, updates per second) since the session started
+    """
+    def rates(self):
+        elapsed = time.perf_counter() - self.start_time
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return self.samples / elapsed, self.updates / elapsed
+
+    """
+    report(self) describes the rates for the training progress printout
+    """
+    def report(self):
+        samples_per_second, updates_per_second = self.rates()
+        achieved = self.updates / self.samples if self.samples else 0.0
+        return (f"Samples/sec: {samples_per_second:.0f}, Updates/sec: {updates_per_second:.0f} "
+                f"(replay ratio {achieved:.2f})")
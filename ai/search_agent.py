@@ -0,0 +1,176 @@
+import time
+from game.bitboard import Connect4Bitboard
+from game.batch_env import win_lines
+from game.turns import player_to_move
+
+WIN_SCORE = 1000000
+LINE_SCORES = [0, 1, 4, 16, 0]  # score for a line of four with 0-4 of one player's pieces and none of the other's
+EXACT, LOWER, UPPER = 0, 1, 2  # transposition table entry types
+
+
+"""
+SearchTimeout is raised inside the search when the time budget for a move runs out
+"""
+class SearchTimeout(Exception):
+    pass
+
+
+"""
+This is the SearchAgent class
+it picks moves by looking ahead with negamax and alpha-beta pruning instead of a network
+it searches one ply deeper at a time (iterative deepening) until the per-move time budget runs out,
+and keeps a transposition table so positions reached by different move orders are only searched once
+it has the same act(state, valid_moves) as QAgent so it can be used anywhere a QAgent plays
+"""
+class SearchAgent:
+    def __init__(self, time_budget_ms=200, max_depth=42, player=None, rows=6, cols=7):
+        self.time_budget_ms = time_budget_ms
+        self.max_depth = max_depth
+        self.player = player  # which player this agent is, used when it can't be told from the board
+        self.epsilon = 0
+        self.board = Connect4Bitboard(rows, cols)
+        self.move_order = sorted(range(cols), key=lambda col: abs(col - cols // 2))  # center first
+        # every line of four as a bitmask in the bitboard layout
+        cell_bits = [int(bit) for bit in self.board.cell_bits.flatten()]
+        self.line_masks = [sum(cell_bits[i] for i in line) for line in win_lines(rows, cols)]
+        self.center_mask = sum(int(bit) for bit in self.board.cell_bits[:, cols // 2])
+        self.transposition_table = {}
+        self.table_size = 1000000
+        self.deadline = 0
+        self.nodes = 0
+        self.last_depth = 0  # deepest search finished on the last move
+
+    """
+    act(self, state, valid_moves) picks the best move it can find within the time budget
+    state is the state of the board
+    valid_moves is the list of valid moves
+    """
+    def act(self, state, valid_moves, position_hash=None, mirror_hash=None):
+        self.board.set_state(state)
+        return self.search(player_to_move(state, self.player or 1), valid_moves)
+
+    """
+    search(self, player, valid_moves) runs iterative deepening from the current self.board
+    player is the player to move
+    returns the best move from the deepest search that finished in time
+    """
+    def search(self, player, valid_moves):
+        self.deadline = time.perf_counter() + self.time_budget_ms / 1000
+        self.nodes = 0
+        self.last_depth = 0
+        ordered = [col for col in self.move_order if col in valid_moves]
+        for col in ordered:
+            if self._wins(col, player):
+                return col
+        best_move = ordered[0]
+        root = self.board.copy()
+        empty_cells = self.board.rows * self.board.cols - self.board.moves_played
+        for depth in range(1, min(self.max_depth, empty_cells) + 1):
+            try:
+                score, move = self._search_root(depth, player, ordered)
+            except SearchTimeout:
+                self.board = root  # the search stopped part way through a line, so put the board back
+                break
+            best_move = move
+            self.last_depth = depth
+            ordered.remove(move)
+            ordered.insert(0, move)  # search the best move first next time
+            if abs(score) > WIN_SCORE // 2:
+                break  # a forced win or loss was found, looking deeper won't change it
+        return best_move
+
+    """
+    _search_root(self, depth, player, ordered) searches every root move to depth, returns (score, move)
+    """
+    def _search_root(self, depth, player, ordered):
+        alpha, beta = -WIN_SCORE * 2, WIN_SCORE * 2
+        best_score, best_move = -WIN_SCORE * 2, ordered[0]
+        for col in ordered:
+            self.board.make_move(col, player)
+            score = -self._negamax(depth - 1, -beta, -alpha, 3 - player)
+            self.board.undo_move(col)
+            if score > best_score:
+                best_score, best_move = score, col
+            alpha = max(alpha, score)
+        return best_score, best_move
+
+    """
+    _negamax(self, depth, alpha, beta, player) returns the score of self.board for player (the player to move)
+    """
+    def _negamax(self, depth, alpha, beta, player):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        board = self.board
+        valid = [col for col in self.move_order if board.is_valid_move(col)]
+        if not valid:
+            return 0
+        for col in valid:
+            if self._wins(col, player):
+                return WIN_SCORE - board.moves_played  # winning sooner scores higher
+        if depth == 0:
+            return self._evaluate(player)
+        key = board.key() * 2 + player - 1
+        entry = self.transposition_table.get(key)
+        if entry is not None:
+            entry_depth, entry_score, entry_type, entry_move = entry
+            if entry_depth >= depth:
+                if entry_type == EXACT:
+                    return entry_score
+                if entry_type == LOWER:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+            valid.remove(entry_move)
+            valid.insert(0, entry_move)
+        alpha_start = alpha
+        best_score, best_move = -WIN_SCORE * 2, valid[0]
+        for col in valid:
+            board.make_move(col, player)
+            score = -self._negamax(depth - 1, -beta, -alpha, 3 - player)
+            board.undo_move(col)
+            if score > best_score:
+                best_score, best_move = score, col
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+        if best_score <= alpha_start:
+            entry_type = UPPER
+        elif best_score >= beta:
+            entry_type = LOWER
+        else:
+            entry_type = EXACT
+        if len(self.transposition_table) >= self.table_size:
+            self.transposition_table.clear()
+        self.transposition_table[key] = (depth, best_score, entry_type, best_move)
+        return best_score
+
+    """
+    _wins(self, col, player) checks if player playing col wins right away
+    """
+    def _wins(self, col, player):
+        self.board.make_move(col, player)
+        won = self.board.check_winner(player)
+        self.board.undo_move(col)
+        return won
+
+    """
+    _evaluate(self, player) scores a position that is not over yet from player's point of view
+    every line of four that only one player has pieces in counts for that player,
+    more for more pieces, plus a little for pieces in the center column
+    """
+    def _evaluate(self, player):
+        mine = self.board.bitboards[player - 1]
+        theirs = self.board.bitboards[2 - player]
+        score = 0
+        for mask in self.line_masks:
+            my_cells = mine & mask
+            their_cells = theirs & mask
+            if my_cells and not their_cells:
+                score += LINE_SCORES[bin(my_cells).count('1')]
+            elif their_cells and not my_cells:
+                score -= LINE_SCORES[bin(their_cells).count('1')]
+        score += 2 * (bin(mine & self.center_mask).count('1') - bin(theirs & self.center_mask).count('1'))
+        return score
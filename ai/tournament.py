@@ -0,0 +1,239 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import numpy as np
+from ai.inference import NumpyInference, inference_from_model
+from game.batch_env import BatchConnect4Env
+from utils.async_writer import atomic_path, replace_atomic
+from utils.file_manager import ModelManager
+
+DEFAULT_RESULTS_PATH = "models/tournament_results.json"
+
+"""
+tournament plays every saved model against every other one and ranks them
+each model is loaded once, and only its weights are sent to the worker processes, which play
+with NumpyInference so they never import tensorflow
+every pairing plays half its games with each model moving first, and the first few moves of each
+game are random so that two greedy networks don't just play the same game over and over
+results are cached by the hashes of the two model files, so a re-run only plays pairings
+that involve new or retrained models
+run it from the project folder with: python -m ai.tournament --games 200
+"""
+
+"""
+model_hash(path) returns a short hash of a model file's contents
+"""
+def model_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+"""
+pair_key(hash_a, hash_b) is the cache key for a pairing, the same whichever model is named first
+returns (key, swapped) where swapped is True when hash_b comes first in the key
+"""
+def pair_key(hash_a, hash_b):
+    if hash_b < hash_a:
+        return f"{hash_b}:{hash_a}", True
+    return f"{hash_a}:{hash_b}", False
+
+
+"""
+play_games(first, second, games, opening_plies, rng) plays games of first (player 1) against second (player 2)
+first and second are NumpyInference networks, every game in the batch moves together
+returns (first wins, second wins, draws)
+"""
+def play_games(first, second, games, opening_plies, rng):
+    env = BatchConnect4Env(games, auto_reset=False)
+    winners = np.zeros(games, dtype=np.int8)
+    active = np.ones(games, dtype=bool)
+    ply = 0
+    while active.any():
+        valid_mask = env.valid_move_mask()
+        if ply < opening_plies:
+            scores = rng.random(valid_mask.shape)
+        else:
+            network = first if ply % 2 == 0 else second
+            scores = network.predict(env.get_board_states())
+        scores = np.where(valid_mask, scores, -np.inf)
+        _, step_winners, dones = env.step(np.argmax(scores, axis=1), active)
+        winners[dones] = step_winners[dones]
+        active &= ~dones
+        ply += 1
+    return int(np.count_nonzero(winners == 1)), int(np.count_nonzero(winners == 2)), int(np.count_nonzero(winners == 0))
+
+
+"""
+play_pairing(weights_a, weights_b, games, opening_plies, seed) runs in a worker process
+it plays games between two models, half with each one moving first
+returns (a wins, b wins, draws)
+"""
+def play_pairing(weights_a, weights_b, games, opening_plies, seed):
+    rng = np.random.default_rng(seed)
+    network_a = NumpyInference(*weights_a)
+    network_b = NumpyInference(*weights_b)
+    a_first = games // 2
+    a_wins, b_wins, draws = play_games(network_a, network_b, a_first, opening_plies, rng)
+    b_wins_2, a_wins_2, draws_2 = play_games(network_b, network_a, games - a_first, opening_plies, rng)
+    return a_wins + a_wins_2, b_wins + b_wins_2, draws + draws_2
+
+
+"""
+bradley_terry(names, results, iterations) fits a Bradley-Terry strength for every model
+results is a list of (name_a, name_b, a wins, b wins, draws), a draw counts as half a win for each
+the strengths are turned into elo ratings averaging 1500
+"""
+def bradley_terry(names, results, iterations=1000):
+    index = {name: i for i, name in enumerate(names)}
+    n = len(names)
+    wins = np.zeros((n, n))  # wins[i][j] is how many points i scored against j
+    for name_a, name_b, a_wins, b_wins, draws in results:
+        i, j = index[name_a], index[name_b]
+        wins[i][j] += a_wins + 0.5 * draws
+        wins[j][i] += b_wins + 0.5 * draws
+    games = wins + wins.T
+    # a small prior of one drawn game against every other model keeps unbeaten or winless models finite
+    wins += 0.5 * (1 - np.eye(n))
+    games += 1 - np.eye(n)
+    strength = np.ones(n)
+    for _ in range(iterations):
+        denominator = (games / (strength[:, None] + strength[None, :])).sum(axis=1)
+        new_strength = wins.sum(axis=1) / denominator
+        new_strength /= np.exp(np.log(new_strength).mean())
+        if np.allclose(new_strength, strength, rtol=1e-10):
+            break
+        strength = new_strength
+    elo = 400 * np.log10(strength)
+    return {name: 1500 + float(elo[i] - elo.mean()) for name, i in index.items()}
+
+
+"""
+load_results(path) reads the cached pairing results, an empty dict if there are none yet
+"""
+def load_results(path=DEFAULT_RESULTS_PATH):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading tournament results, playing every pairing again: {e}")
+        return {}
+
+
+"""
+save_results(results, path) writes the cached pairing results
+"""
+def save_results(results, path=DEFAULT_RESULTS_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(atomic_path(path), 'w') as f:
+        json.dump(results, f, indent=2)
+    replace_atomic(path)
+
+
+"""
+load_networks(model_manager, filenames) loads each of the given saved models once
+returns a dict of model name -> (weights, activations) for the workers to build NumpyInference from
+models that fail to load are left out
+"""
+def load_networks(model_manager, filenames):
+    networks = {}
+    if not filenames:
+        return networks
+    from tensorflow import keras
+    for filename in filenames:
+        path = os.path.join(model_manager.models_dir, filename)
+        try:
+            network = inference_from_model(keras.models.load_model(path, compile=False))
+        except Exception as e:
+            print(f"Skipping {filename}: {e}")
+            continue
+        weights = [w for pair in zip(network.kernels, network.biases) for w in pair]
+        networks[filename] = (weights, network.activation_names)
+    return networks
+
+
+"""
+run_tournament(games, num_workers, opening_plies, results_path, model_manager) plays every pairing
+that isn't cached yet and returns (ratings, table)
+ratings is a dict of model name -> elo
+table is a list of (name_a, name_b, a wins, b wins, draws) for every pairing
+"""
+def run_tournament(games=200, num_workers=None, opening_plies=2, results_path=DEFAULT_RESULTS_PATH,
+                   model_manager=None):
+    model_manager = model_manager or ModelManager()
+    names = [filename for filename, _ in model_manager.list_saved_models()]
+    hashes = {name: model_hash(os.path.join(model_manager.models_dir, name)) for name in names}
+    cache = load_results(results_path)
+    table = []
+    to_play = []
+    for i, name_a in enumerate(names):
+        for name_b in names[i + 1:]:
+            key, swapped = pair_key(hashes[name_a], hashes[name_b])
+            entry = cache.get(key)
+            if entry is not None and entry['games'] == games and entry['opening_plies'] == opening_plies:
+                first_wins, second_wins = entry['first_wins'], entry['second_wins']
+                a_wins, b_wins = (second_wins, first_wins) if swapped else (first_wins, second_wins)
+                table.append((name_a, name_b, a_wins, b_wins, entry['draws']))
+            else:
+                to_play.append((name_a, name_b, key, swapped))
+    # only models in a pairing that still has to be played are loaded (and tensorflow with them)
+    networks = load_networks(model_manager, sorted({name for a, b, _, _ in to_play for name in (a, b)}))
+    to_play = [pairing for pairing in to_play if pairing[0] in networks and pairing[1] in networks]
+    print(f"{len(table)} pairings cached, {len(to_play)} to play")
+    if to_play:
+        jobs = [(networks[a], networks[b], games, opening_plies, seed)
+                for seed, (a, b, _, _) in enumerate(to_play)]
+        num_workers = num_workers or max(1, (os.cpu_count() or 2) - 1)
+        # spawn instead of fork because tensorflow is not safe to fork
+        with multiprocessing.get_context('spawn').Pool(min(num_workers, len(jobs))) as pool:
+            outcomes = pool.starmap(play_pairing, jobs)
+        for (name_a, name_b, key, swapped), (a_wins, b_wins, draws) in zip(to_play, outcomes):
+            first_wins, second_wins = (b_wins, a_wins) if swapped else (a_wins, b_wins)
+            cache[key] = {'games': games, 'opening_plies': opening_plies, 'first_wins': first_wins,
+                          'second_wins': second_wins, 'draws': draws}
+            table.append((name_a, name_b, a_wins, b_wins, draws))
+        save_results(cache, results_path)
+    rated = [name for name in names if any(name in pairing[:2] for pairing in table)]
+    return bradley_terry(rated, table), table
+
+
+"""
+print_ladder(ratings, table) prints the models from best to worst with their records
+"""
+def print_ladder(ratings, table):
+    records = {name: [0, 0, 0] for name in ratings}
+    for name_a, name_b, a_wins, b_wins, draws in table:
+        records[name_a][0] += a_wins
+        records[name_a][1] += b_wins
+        records[name_b][0] += b_wins
+        records[name_b][1] += a_wins
+        records[name_a][2] += draws
+        records[name_b][2] += draws
+    print(f"{'Rank':<5}{'Model':<30}{'Elo':>7}{'W':>7}{'L':>7}{'D':>7}")
+    for rank, name in enumerate(sorted(ratings, key=ratings.get, reverse=True), 1):
+        wins, losses, draws = records[name]
+        print(f"{rank:<5}{name:<30}{ratings[name]:>7.0f}{wins:>7}{losses:>7}{draws:>7}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play every saved model against every other one.')
+    parser.add_argument('--games', type=int, default=200, help='games per pairing (half with each model first)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: cpu count - 1)')
+    parser.add_argument('--opening-plies', type=int, default=2,
+                        help='random moves at the start of each game so the games differ')
+    parser.add_argument('--models-dir', default='models/saved_models', help='where models are saved')
+    parser.add_argument('--results', default=DEFAULT_RESULTS_PATH, help='where pairing results are cached')
+    args = parser.parse_args(argv)
+    ratings, table = run_tournament(args.games, args.workers, args.opening_plies, args.results,
+                                    ModelManager(args.models_dir))
+    print_ladder(ratings, table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import argparse
+from ai.q_agent import QAgent
+from ai.scheduler import ReplaySchedule
+from ai.heuristics import HEURISTICS
+from ai.training import TrainingManager
+from game.board import make_board
+from utils.file_manager import ModelManager
+
+"""
+train is the command line way to train a model without the pygame window
+it never imports pygame or the display so it can run on servers and in containers
+run it from the project folder, for example:
+    python -m ai.train --episodes 5000 --mode self_play --model-name new_model
+"""
+
+"""
+parse_args(argv) reads the command line options
+argv is the list of arguments (sys.argv is used when it is None)
+"""
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Train the Connect 4 AI without the game window.')
+    parser.add_argument('--episodes', type=int, default=1000, help='number of training episodes')
+    parser.add_argument('--mode', default='self_play', choices=['self_play', 'vs_random', 'vs_heuristic', 'actor_learner'],
+                        help='training mode')
+    parser.add_argument('--model-name', default=None,
+                        help='name to save the model as (a dated name is made if left out)')
+    parser.add_argument('--load', action='store_true',
+                        help='keep training the saved model called --model-name instead of a new one')
+    parser.add_argument('--batch-size', type=int, default=32, help='transitions per replay')
+    parser.add_argument('--target-update', type=int, default=10,
+                        help='gradient steps between target network updates')
+    parser.add_argument('--steps-per-episode', type=int, default=1,
+                        help='gradient steps after every episode')
+    parser.add_argument('--replay-ratio', type=float, default=None,
+                        help='gradient steps per move played, mirror images not counted (replaces --steps-per-episode)')
+    parser.add_argument('--polyak', type=float, default=None, metavar='TAU',
+                        help='move the target network TAU of the way after every gradient step '
+                             'instead of copying it every --target-update steps')
+    parser.add_argument('--mirror', action='store_true',
+                        help='also learn from the mirror image of every move')
+    parser.add_argument('--heuristic', default='lookahead', choices=list(HEURISTICS),
+                        help='scripted opponent for vs_heuristic mode')
+    parser.add_argument('--envs', type=int, default=16, help='games played at the same time in vs_heuristic mode')
+    parser.add_argument('--prioritized', action='store_true',
+                        help='replay the transitions with the biggest errors more often')
+    parser.add_argument('--n-step', type=int, default=1,
+                        help='moves per stored transition, more spreads wins and losses back faster')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes for actor_learner mode (default: cpu count - 1)')
+    parser.add_argument('--checkpoint-every', type=int, default=None,
+                        help='save a checkpoint every this many episodes')
+    parser.add_argument('--checkpoint-seconds', type=float, default=None,
+                        help='save a checkpoint every this many seconds')
+    parser.add_argument('--resume', action='store_true',
+                        help='carry on from the last checkpoint of --model-name')
+    parser.add_argument('--board', default='array', choices=['array', 'bitboard'], help='board backend')
+    parser.add_argument('--models-dir', default='models/saved_models', help='where models are saved')
+    parser.add_argument('--checkpoints-dir', default='models/checkpoints', help='where checkpoints are saved')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    model_manager = ModelManager(args.models_dir, args.checkpoints_dir)
+    model_name = model_manager.generate_model_name(args.model_name)
+    agent = QAgent(mirror_augment=args.mirror, prioritized=args.prioritized,
+                   n_step=args.n_step)
+    agent.models_dir = args.models_dir
+    trainer = TrainingManager(agent, make_board(args.board), batch_size=args.batch_size,
+                              target_update_interval=args.target_update)
+    trainer.model_manager = model_manager
+    mode, episodes = args.mode, args.episodes
+    schedule = ReplaySchedule(args.batch_size, args.steps_per_episode, args.replay_ratio, args.target_update,
+                              args.polyak)
+    if args.checkpoint_every or args.checkpoint_seconds:
+        trainer.enable_checkpoints(model_name, args.checkpoint_every, args.checkpoint_seconds)
+    if args.resume:
+        state = trainer.resume(model_name)
+        if state is None:
+            print(f"No checkpoint found for {model_name}, starting a new session")
+        else:
+            mode, episodes = state['mode'], state['episodes']
+            print(f"Resuming {mode} from episode {state['episode']} of {episodes}")
+    elif args.load:
+        agent.load_model(model_name)
+        metadata = model_manager.get_model_info(model_name)
+        trainer.training_stats['total_episodes'] = metadata.get('episodes', 0)
+        agent.epsilon = metadata.get('final_epsilon', agent.epsilon)
+    training_stats = trainer.train(mode=mode, episodes=episodes, num_workers=args.workers, schedule=schedule,
+                                   opponent=args.heuristic, num_envs=args.envs)
+    model_manager.save_model(
+        agent,
+        model_name,
+        {
+            'episodes': training_stats['total_episodes'],
+            'win_rate': training_stats['win_rate'],
+            'final_epsilon': training_stats.get('final_epsilon', 0)
+        }
+    )
+    print(f"Saved model {model_name} after {training_stats['total_episodes']} total episodes")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,15 @@
 import random
+import multiprocessing
+import os
+import queue
+import time
 import numpy as np
+from ai.actors import actor_worker
+from ai.evaluation import evaluate, print_results
+from ai.scheduler import ReplaySchedule
+from ai.n_step import NStepAccumulator
+from ai.heuristics import make_heuristic
+from game.batch_env import BatchConnect4Env
 from game.board import Connect4Board
 from utils.file_manager import ModelManager
 
@@ -8,8 +18,10 @@ this is the TrainingManager class
 it manages the model training as well as handling the different types of training
 """
 class TrainingManager:
-    def __init__(self, agent, board):
+    def __init__(self, agent, board, batch_size=32, target_update_interval=10):
         self.model_name = None
+        self.batch_size = batch_size  # transitions per replay
+        self.target_update_interval = target_update_interval  # gradient steps between target network updates
         self.training_stats = {
             'episodes': 0,
             'wins': 0,
@@ -19,15 +31,27 @@ class TrainingManager:
             'total_episodes': 0
         }
         self.agent = agent
+        # every transition goes through here on its way to agent.remember
+        self.transitions = NStepAccumulator(agent.remember, agent.n_step, agent.gamma)
         self.model_manager = ModelManager()
         self.board = board
+        self.checkpoint_name = None
+        self.checkpoint_every = None  # episodes between checkpoints
+        self.checkpoint_seconds = None  # seconds between checkpoints
+        self.last_checkpoint_time = time.time()
+        self.resume_state = None
+        self.current_mode = None
+        self.current_episode = 0
+        self.current_episodes = 0
+        self.schedules = {}  # mode -> ReplaySchedule, modes without one use default_schedule()
+        self.schedule = None  # the schedule of the session that is running
 
     """
     initialize(self, model_name) initializes the model
     """
     def initialize(self, model_name):
         self.model_name = model_name
-        self.training_stats['total_episodes'] = self.model_manager.load_metadata(self.model_name)
+        self.training_stats['total_episodes'] = self.model_manager.load_metadata(self.model_name).get('episodes', 0)
 
     """
     train(self, mode, **kwargs) finds what type of training it is and sends it to that specific
@@ -36,9 +60,11 @@ class TrainingManager:
     **kwargs is a generic dictionary parameter for the trainer
     """
     def train(self, mode='self_play', **kwargs):
-        valid_modes = ['self_play', 'vs_random', 'vs_human']
+        valid_modes = ['self_play', 'vs_random', 'vs_heuristic', 'vs_human', 'actor_learner']
         if mode not in valid_modes:
             raise ValueError(f"Invalid mode. Choose from {valid_modes}")
+        if kwargs.get('schedule') is not None:
+            self.schedules[mode] = kwargs['schedule']
         try:
             if mode == 'self_play':
                 episodes = kwargs.get('episodes')
@@ -46,15 +72,124 @@ class TrainingManager:
             elif mode == 'vs_random':
                 episodes = kwargs.get('episodes')
                 return self._train_against_random(episodes)
+            elif mode == 'vs_heuristic':
+                episodes = kwargs.get('episodes')
+                opponent = kwargs.get('opponent') or 'lookahead'
+                if isinstance(opponent, str):
+                    opponent = make_heuristic(opponent)
+                return self._train_against_heuristic(episodes, opponent, kwargs.get('num_envs', 16))
             elif mode == 'vs_human':
                 human_move_callback = kwargs.get('human_move_callback')
                 if not human_move_callback:
                     raise ValueError("Human move callback required for human training mode")
                 return self._train_against_human(human_move_callback)
+            elif mode == 'actor_learner':
+                episodes = kwargs.get('episodes')
+                num_workers = kwargs.get('num_workers') or max(1, (os.cpu_count() or 2) - 1)
+                sync_interval = kwargs.get('sync_interval', 10)
+                return self._train_actor_learner(episodes, num_workers, sync_interval)
+        except KeyboardInterrupt:
+            # save where we got to so the run can be resumed
+            if self.checkpoint_name is not None and self.current_mode == mode:
+                self.save_checkpoint()
+                self.model_manager.wait_for_saves()
+            raise
         except Exception as e:
             print(f"Training Error: {e}")
             raise
 
+    """
+    enable_checkpoints(self, name, every_episodes, every_seconds) turns on automatic checkpoints
+    name is the name the checkpoint is saved under (usually the model name)
+    every_episodes is how many episodes go by between checkpoints
+    every_seconds is how many seconds go by between checkpoints
+    a checkpoint is saved when either one is reached (None turns that one off)
+    """
+    def enable_checkpoints(self, name, every_episodes=None, every_seconds=None):
+        self.checkpoint_name = name
+        self.checkpoint_every = every_episodes
+        self.checkpoint_seconds = every_seconds
+        self.last_checkpoint_time = time.time()
+
+    """
+    save_checkpoint(self) saves the agent and how far the current training session got
+    """
+    def save_checkpoint(self):
+        state = {
+            'mode': self.current_mode,
+            'episode': self.current_episode,
+            'episodes': self.current_episodes,
+            'training_stats': dict(self.training_stats),
+            'schedule': self.schedule.get_state()
+        }
+        self.model_manager.save_checkpoint(self.agent, self.checkpoint_name, state)
+        self.last_checkpoint_time = time.time()
+
+    """
+    resume(self, name) loads the checkpoint called name so the next train() call carries on from it
+    returns the saved state (with 'mode' and 'episodes' to pass back into train), or None if
+    there is no checkpoint
+    """
+    def resume(self, name):
+        state = self.model_manager.load_checkpoint(self.agent, name)
+        self.resume_state = state
+        if state is not None and self.checkpoint_name is None:
+            self.checkpoint_name = name
+        return state
+
+    """
+    default_schedule() is the schedule for modes that weren't given one:
+    one replay of batch_size after every episode and a hard target sync every target_update_interval steps
+    """
+    def default_schedule(self):
+        return ReplaySchedule(self.batch_size, target_update_interval=self.target_update_interval)
+
+    """
+    _start_schedule(self, mode) picks the schedule for mode and starts its counters
+    """
+    def _start_schedule(self, mode):
+        if mode not in self.schedules:
+            self.schedules[mode] = self.default_schedule()
+        self.schedule = self.schedules[mode]
+        self.schedule.start(self.agent)
+        self.transitions.reset()  # a game cut off in an earlier session must not run into this one
+
+    """
+    _start_session(self, mode, episodes) starts the stats for a training session
+    returns the episode to start from (0 unless a checkpoint is being resumed)
+    """
+    def _start_session(self, mode, episodes):
+        self.current_mode = mode
+        self.current_episodes = episodes
+        self.last_checkpoint_time = time.time()
+        self._start_schedule(mode)
+        state = self.resume_state
+        self.resume_state = None
+        if state is None:
+            self.reset_stats()
+            self.current_episode = 0
+            return 0
+        if state['mode'] != mode:
+            raise ValueError(f"Checkpoint was saved in {state['mode']} mode, not {mode}")
+        self.training_stats.update(state['training_stats'])
+        if 'schedule' in state:
+            self.schedule.set_state(state['schedule'])
+        self.current_episode = state['episode']
+        return state['episode']
+
+    """
+    _end_episode(self, episode) records that an episode finished and saves a checkpoint when one is due
+    """
+    def _end_episode(self, episode):
+        self.current_episode = episode + 1
+        if self.checkpoint_name is None:
+            return
+        due = self.checkpoint_every is not None and self.current_episode % self.checkpoint_every == 0
+        if self.checkpoint_seconds is not None and time.time() - self.last_checkpoint_time >= self.checkpoint_seconds:
+            due = True
+        if due:
+            self.save_checkpoint()
+
     """
     _self_play_episode() has the ai play an episode againts itself.
     """
@@ -67,7 +202,7 @@ class TrainingManager:
             valid_moves = self.board.get_valid_moves()
             if not valid_moves:
                 return 0
-            action = self.agent.act(state, valid_moves)
+            action = self.agent.act(state, valid_moves, self.board.hash, self.board.mirror_hash)
             prev_state = state
             row = self.board.make_move(action, current_player)
             reward += 10
@@ -77,9 +212,9 @@ class TrainingManager:
                     reward += 100
                 else:
                     reward += -100
-                self.agent.remember(prev_state, action, reward, new_state, True)
+                self.transitions.add(prev_state, action, reward, new_state, True)
                 return current_player
-            self.agent.remember(prev_state, action, reward, new_state, False)
+            self.transitions.add(prev_state, action, reward, new_state, False)
             current_player = 3-current_player
 
     """
@@ -87,8 +222,8 @@ class TrainingManager:
     it sends to _self_play_episode() for each individual episode
     """
     def _train_self_play(self, episodes):
-        self.reset_stats()
-        for episode in range(episodes):
+        start = self._start_session('self_play', episodes)
+        for episode in range(start, episodes):
             result = self._self_play_episode()
             if result == 1:
                 self.training_stats['wins'] += 1
@@ -99,23 +234,106 @@ class TrainingManager:
             self.training_stats['episodes'] += 1
             self.training_stats['total_episodes'] += 1
             self.training_stats['win_rate'] = self.training_stats['wins'] / self.training_stats['episodes']
-            self.agent.replay()
-            if episode % 10 == 0:
-                self.agent.update_target_network()
+            self.transitions.end_episode()
+            self.schedule.after_episode(self.agent)
             if episode % 100 == 0 or episode % 100 == 1:
                 self.get_training_progress()
+            self._end_episode(episode)
         print(f"Final Epsilon: {self.agent.epsilon}")
         self.training_stats['final_epsilon'] = self.agent.epsilon
         return self.training_stats
 
+    """
+    _train_actor_learner(self, episodes, num_workers, sync_interval) is the overarching code for the
+    actor/learner self train mode
+    num_workers processes play self-play games with a copy of the network and send their transitions
+    back here, this process remembers them and does all of the replay (gradient steps)
+    sync_interval is how many episodes go by before the workers get the newest weights
+    """
+    def _train_actor_learner(self, episodes, num_workers, sync_interval=10):
+        start = self._start_session('actor_learner', episodes)
+        # spawn instead of fork because tensorflow is not safe to fork
+        context = multiprocessing.get_context('spawn')
+        results_queue = context.Queue(maxsize=num_workers * 4)
+        stop_event = context.Event()
+        weights_queues = [context.Queue() for _ in range(num_workers)]
+        self._send_weights(weights_queues)
+        workers = [context.Process(target=actor_worker,
+                                   args=(weights_queues[i], results_queue, stop_event, random.getrandbits(32)),
+                                   daemon=True)
+                   for i in range(num_workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            for episode in range(start, episodes):
+                result, transitions = self._get_game(results_queue, workers)
+                for transition in transitions:
+                    self.transitions.add(*transition)
+                if result == 1:
+                    self.training_stats['wins'] += 1
+                elif result == 2:
+                    self.training_stats['losses'] += 1
+                elif result == 0:
+                    self.training_stats['draws'] += 1
+                self.training_stats['episodes'] += 1
+                self.training_stats['total_episodes'] += 1
+                self.training_stats['win_rate'] = self.training_stats['wins'] / self.training_stats['episodes']
+                self.transitions.end_episode()
+                self.schedule.after_episode(self.agent)
+                if episode % sync_interval == 0:
+                    self._send_weights(weights_queues)
+                if episode % 100 == 0 or episode % 100 == 1:
+                    self.get_training_progress()
+                self._end_episode(episode)
+        finally:
+            stop_event.set()
+            # empty the queue so the workers are not stuck trying to send a game
+            try:
+                while True:
+                    results_queue.get_nowait()
+            except queue.Empty:
+                pass
+            for worker in workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
+            for weights_queue in weights_queues:
+                # weights nobody read any more should not keep this process from exiting
+                weights_queue.cancel_join_thread()
+        print(f"Final Epsilon: {self.agent.epsilon}")
+        self.training_stats['final_epsilon'] = self.agent.epsilon
+        return self.training_stats
+
+    """
+    _get_game(self, results_queue, workers) waits for the next finished game from the workers
+    the workers only stop when they are told to, so if one has exited it must have crashed and
+    an error is raised instead of waiting forever for games that will never come
+    """
+    def _get_game(self, results_queue, workers, poll_seconds=5):
+        while True:
+            try:
+                return results_queue.get(timeout=poll_seconds)
+            except queue.Empty:
+                for i, worker in enumerate(workers):
+                    if not worker.is_alive():
+                        raise RuntimeError(f"Actor worker {i} stopped unexpectedly (exit code {worker.exitcode})")
+
+    """
+    _send_weights(self, weights_queues) sends the current network weights and epsilon to every worker
+    """
+    def _send_weights(self, weights_queues):
+        weights = self.agent.q_network.get_weights()
+        for weights_queue in weights_queues:
+            weights_queue.put((weights, self.agent.epsilon))
+
     """
     _train_against_random(self, episodes) is the overarching code for the random train mode
     it has the agent play against a random move
     """
     def _train_against_random(self, episodes):
         reward = 0
-        self.reset_stats()
-        for episode in range(episodes):
+        start = self._start_session('vs_random', episodes)
+        for episode in range(start, episodes):
             self.board.reset()
             current_player = 1
             while True:
@@ -125,7 +343,7 @@ class TrainingManager:
                     self.training_stats['draws'] += 1
                     break
                 if current_player == 1:
-                    action = self.agent.act(state, valid_moves)
+                    action = self.agent.act(state, valid_moves, self.board.hash, self.board.mirror_hash)
                     prev_state = state
                     reward += 10
                 else:
@@ -140,20 +358,83 @@ class TrainingManager:
                     else:
                         self.training_stats['losses'] += 1
                         reward += -100
-                    self.agent.remember(prev_state, action, reward, new_state, True)
+                    self.transitions.add(prev_state, action, reward, new_state, True)
                     reward = 0
                     break
                 if current_player == 1:
-                    self.agent.remember(prev_state, action, 0, new_state, False)
+                    self.transitions.add(prev_state, action, 0, new_state, False)
                 current_player = 3-current_player
             self.training_stats['episodes'] += 1
             self.training_stats['total_episodes'] += 1
             self.training_stats['win_rate'] = self.training_stats['wins'] / self.training_stats['episodes']
-            self.agent.replay()
-            if episode % 10 == 0:
-                self.agent.update_target_network()
+            self.transitions.end_episode()
+            self.schedule.after_episode(self.agent)
             if episode % 100 == 0 or episode % 100 == 1:
                 self.get_training_progress()
+            self._end_episode(episode)
+        print(f"Final Epsilon: {self.agent.epsilon}")
+        self.training_stats['final_epsilon'] = self.agent.epsilon
+        return self.training_stats
+
+    """
+    _train_against_heuristic(self, episodes, opponent, num_envs) is the overarching code for the heuristic train mode
+    the agent (player 1) plays num_envs games at the same time against a scripted opponent
+    (like HeuristicOpponent), both sides pick their moves for every game with one act_batch call,
+    so the opponent never needs the network and the agent needs one forward pass per move for all the games
+    every finished game counts as an episode and a new one starts in its place
+    """
+    def _train_against_heuristic(self, episodes, opponent, num_envs=16):
+        start = self._start_session('vs_heuristic', episodes)
+        env = BatchConnect4Env(num_envs, auto_reset=False)
+        # every game needs its own accumulator so the games' moves don't get mixed together
+        accumulators = [NStepAccumulator(self.agent.remember, self.agent.n_step, self.agent.gamma)
+                        for _ in range(num_envs)]
+        episode = start
+        while episode < episodes:
+            # every game is at the start or just had the opponent move, so it is the agent's turn in all of them
+            states = env.get_board_states()
+            actions = self.agent.act_batch(states, env.valid_move_mask())
+            after_agent, winners, agent_done = env.step(actions)
+            playing = ~agent_done
+            if playing.any():
+                opponent_actions = np.zeros(num_envs, dtype=np.intp)
+                opponent_actions[playing] = opponent.act_batch(after_agent[playing], env.valid_move_mask()[playing])
+                after_opponent, opponent_winners, opponent_done = env.step(opponent_actions, playing)
+            else:
+                # every game ended on the agent's move, so the opponent has nothing to play
+                after_opponent, opponent_done = after_agent, np.zeros_like(agent_done)
+                opponent_winners = np.zeros_like(winners)
+            winners = np.where(agent_done, winners, opponent_winners)
+            for i in np.flatnonzero(agent_done):
+                # the agent won, or filled the board
+                accumulators[i].add(states[i], actions[i], 100 if winners[i] == 1 else 0, after_agent[i], True)
+            for i in np.flatnonzero(playing):
+                if opponent_done[i] and opponent_winners[i] == 2:
+                    # the agent's move let the opponent win
+                    accumulators[i].add(states[i], actions[i], -100, after_opponent[i], True)
+                else:
+                    # the next state is the board when it is the agent's turn again
+                    accumulators[i].add(states[i], actions[i], 0, after_opponent[i], bool(opponent_done[i]))
+            finished = agent_done | opponent_done
+            for i in np.flatnonzero(finished):
+                if episode >= episodes:
+                    break
+                if winners[i] == 1:
+                    self.training_stats['wins'] += 1
+                elif winners[i] == 2:
+                    self.training_stats['losses'] += 1
+                else:
+                    self.training_stats['draws'] += 1
+                self.training_stats['episodes'] += 1
+                self.training_stats['total_episodes'] += 1
+                self.training_stats['win_rate'] = self.training_stats['wins'] / self.training_stats['episodes']
+                accumulators[i].end_episode()
+                self.schedule.after_episode(self.agent)
+                if episode % 100 == 0 or episode % 100 == 1:
+                    self.get_training_progress()
+                self._end_episode(episode)
+                episode += 1
+            env.reset(finished)
         print(f"Final Epsilon: {self.agent.epsilon}")
         self.training_stats['final_epsilon'] = self.agent.epsilon
         return self.training_stats
@@ -165,6 +446,7 @@ class TrainingManager:
     def _train_against_human(self, human_move_callback):
         reward = 0
         self.reset_stats()
+        self._start_schedule('vs_human')
         current_player = random.randint(1, 2)
         self.board.reset()
         while True:
@@ -174,7 +456,7 @@ class TrainingManager:
                 self.training_stats['draws'] += 1
                 break
             if current_player == 1:
-                action = self.agent.act(state, valid_moves)
+                action = self.agent.act(state, valid_moves, self.board.hash, self.board.mirror_hash)
                 reward += 10
                 prev_state = state
             else:
@@ -189,66 +471,31 @@ class TrainingManager:
                 else:
                     self.training_stats['losses'] += 1
                     reward += -100
-                self.agent.remember(prev_state, action, reward, new_state, True)
+                self.transitions.add(prev_state, action, reward, new_state, True)
                 break
             if current_player == 1:
-                self.agent.remember(prev_state, action, 0, new_state, False)
+                self.transitions.add(prev_state, action, 0, new_state, False)
             current_player = 3-current_player
         self.training_stats['episodes'] += 1
         self.training_stats['total_episodes'] += 1
         self.training_stats['win_rate'] = self.training_stats['wins'] / self.training_stats['episodes']
-        self.agent.replay()
+        self.transitions.end_episode()
+        self.schedule.after_episode(self.agent)
         self.training_stats['final_epsilon'] = self.agent.epsilon
         self.get_training_progress()
         return self.training_stats
 
     """
-    evaluate_agent(self, num_games) evaluates the performance of the trained model
+    evaluate_agent(self, num_games, opponent) evaluates the performance of the trained model
+    opponent is anything with act(state, valid_moves) (like a SearchAgent or MCTSAgent), random moves if None
+    the games are played in lockstep batches by ai.evaluation, so nothing is remembered and
+    training_stats is left alone
+    returns the results from ai.evaluation.evaluate (wins, losses, draws, rates and confidence intervals)
     """
-    def evaluate_agent(self, num_games=100):
-        self.reset_stats()
-        reward = 0
-        original_epsilon = self.agent.epsilon
-        self.agent.epsilon = 0
-        for episode in range(num_games):
-            self.board.reset()
-            current_player = 1
-            while True:
-                state = self.board.get_board_state()
-                valid_moves = self.board.get_valid_moves()
-                if not valid_moves:
-                    self.training_stats['draws'] += 1
-                    break
-                if current_player == 1:
-                    action = self.agent.act(state, valid_moves)
-                    reward += 10
-                    prev_state = state
-                else:
-                    action = random.choice(valid_moves)
-                    prev_state = state
-                row = self.board.make_move(action, current_player)
-                new_state = self.board.get_board_state()
-                if self.board.check_winner(current_player, row, action):
-                    if current_player == 1:
-                        self.training_stats['wins'] += 1
-                        reward += 100
-                    else:
-                        self.training_stats['losses'] += 1
-                        reward += -100
-                    self.agent.remember(prev_state, action, reward, new_state, True)
-                    break
-                if current_player == 1:
-                    self.agent.remember(prev_state, action, 0, new_state, False)
-                current_player = 3 - current_player
-            self.training_stats['episodes'] += 1
-            self.training_stats['total_episodes'] += 1
-            self.training_stats['win_rate'] = self.training_stats['wins'] / self.training_stats['episodes']
-            if episode % 100 == 0 or episode % 100 == 1:
-                self.get_training_progress()
-        self.agent.epsilon = original_epsilon
-        print(f"Final Epsilon: {self.agent.epsilon}")
-        self.training_stats['final_epsilon'] = self.agent.epsilon
-        return self.training_stats
+    def evaluate_agent(self, num_games=100, opponent=None):
+        results = evaluate(self.agent, num_games, opponent)
+        print_results(results)
+        return results
 
     """
     get_training_progress() gets the training progress of the model while training
@@ -261,6 +508,8 @@ class TrainingManager:
         print(f"Losses: {self.training_stats['losses']}")
         print(f"Draws: {self.training_stats['draws']}")
         print(f"Current Epsilon: {self.agent.epsilon}")
+        if self.schedule is not None:
+            print(self.schedule.report())
         print("-------------------------------")
 
     """
@@ -0,0 +1,26 @@
+from ai.mcts_agent import MCTSAgent
+from game.board import Connect4Board
+
+"""
+mcts_benchmark measures MCTSAgent simulations/sec for a few playout batch sizes
+use it to pick time_budget_ms or max_simulations for the machine it will run on
+run it from the project folder with: python -m benchmarks.mcts_benchmark
+"""
+
+"""
+simulations_per_second(batch_size, simulations) times one search from the empty board
+"""
+def simulations_per_second(batch_size, simulations=4000):
+    board = Connect4Board()
+    agent = MCTSAgent(time_budget_ms=None, max_simulations=simulations, batch_size=batch_size, seed=0)
+    agent.act(board.get_board_state(), board.get_valid_moves())
+    return agent.sims_per_second
+
+
+def main():
+    for batch_size in [1, 16, 64, 256]:
+        print(f"batch size {batch_size:>4}: {simulations_per_second(batch_size):8.0f} simulations/sec")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import random
+import time
+import numpy as np
+from ai.q_agent import QAgent
+from game.board import Connect4Board
+
+"""
+replay_benchmark compares replay-steps/sec of the old per-transition replay loop
+against the batched QAgent.replay on the cpu
+run it from the project folder with: python -m benchmarks.replay_benchmark
+"""
+
+"""
+fill_memory(agent, transitions) plays random games until the agent has enough memory to replay
+agent is the QAgent whose memory gets filled
+transitions is how many transitions to store
+"""
+def fill_memory(agent, transitions=2000):
+    board = Connect4Board()
+    while len(agent.memory) < transitions:
+        board.reset()
+        player = 1
+        while board.get_valid_moves():
+            state = board.get_board_state()
+            action = random.choice(board.get_valid_moves())
+            row = board.make_move(action, player)
+            done = board.check_winner(player, row, action)
+            agent.remember(state, action, 100 if done else 0, board.get_board_state(), done)
+            if done:
+                break
+            player = 3 - player
+
+
+"""
+loop_replay(agent, batch_size) is the old replay that called predict once per transition
+it is only kept here to compare against
+"""
+def loop_replay(agent, batch_size=32):
+    batch = zip(*agent.memory.sample(batch_size))
+    states = []
+    targets = []
+    for state, action, reward, next_state, done in batch:
+        state = state.reshape(1, -1)
+        next_state = next_state.reshape(1, -1)
+        target = agent.q_network.predict(state, verbose=0)[0]
+        if done:
+            target[action] = reward
+        else:
+            next_q_values = agent.target_network.predict(next_state, verbose=0)[0]
+            target[action] = reward + 0.95 * np.max(next_q_values)
+        states.append(state[0])
+        targets.append(target)
+    agent.q_network.fit(np.array(states), np.array(targets), epochs=1, verbose=0)
+
+
+"""
+steps_per_second(replay, agent, steps) times how many replay steps run per second
+"""
+def steps_per_second(replay, agent, steps):
+    replay(agent, 32)  # warm up so graph building is not timed
+    start = time.perf_counter()
+    for _ in range(steps):
+        replay(agent, 32)
+    return steps / (time.perf_counter() - start)
+
+
+def main():
+    agent = QAgent()
+    fill_memory(agent)
+    before = steps_per_second(loop_replay, agent, 5)
+    after = steps_per_second(QAgent.replay, agent, 50)
+    print(f"per-transition predict loop: {before:.2f} replay-steps/sec")
+    print(f"batched replay:              {after:.2f} replay-steps/sec")
+    print(f"speedup:                     {after / before:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import time
+import numpy as np
+from ai.q_agent import QAgent
+from benchmarks.replay_benchmark import fill_memory
+
+"""
+train_step_benchmark compares gradient-steps/sec of the old keras fit replay
+against the compiled train step in QAgent.replay on the cpu
+run it from the project folder with: python -m benchmarks.train_step_benchmark
+"""
+
+"""
+fit_replay(agent, batch_size) is the replay that called fit once per minibatch
+it is only kept here to compare against
+"""
+def fit_replay(agent, batch_size=32):
+    states, actions, rewards, next_states, dones = agent.memory.sample(batch_size)
+    states = states.astype(np.float32)
+    next_states = next_states.astype(np.float32)
+    targets = agent.q_network.predict_on_batch(states)
+    next_q_values = agent.target_network.predict_on_batch(next_states)
+    targets[np.arange(batch_size), actions] = np.where(
+        dones, rewards, rewards + agent.gamma * np.max(next_q_values, axis=1))
+    agent.q_network.fit(states, targets, epochs=1, verbose=0)
+
+
+"""
+gradient_steps_per_second(replay, calls, steps_per_call) times how many gradient steps run per second
+"""
+def gradient_steps_per_second(replay, calls, steps_per_call=1):
+    replay()  # warm up so graph building is not timed
+    start = time.perf_counter()
+    for _ in range(calls):
+        replay()
+    return calls * steps_per_call / (time.perf_counter() - start)
+
+
+def main():
+    agent = QAgent()
+    fill_memory(agent)
+    results = [('keras fit per minibatch', gradient_steps_per_second(lambda: fit_replay(agent), 20))]
+    for steps in [1, 8, 32]:
+        rate = gradient_steps_per_second(lambda: agent.replay(32, steps), max(200 // steps, 10), steps)
+        results.append((f"compiled step, {steps} per call", rate))
+    for name, rate in results:
+        print(f"{name:<28} {rate:8.1f} gradient-steps/sec")
+    print(f"speedup (1 per call):        {results[1][1] / results[0][1]:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import numpy as np
+
+"""
+win_lines(rows, cols) returns every line of four cells on the board
+as a (num_lines, 4) array of indexes into the flattened board
+"""
+def win_lines(rows=6, cols=7):
+    lines = []
+    for r in range(rows):
+        for c in range(cols):
+            for dr, dc in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+                end_r, end_c = r + 3 * dr, c + 3 * dc
+                if 0 <= end_r < rows and 0 <= end_c < cols:
+                    lines.append([(r + i * dr) * cols + (c + i * dc) for i in range(4)])
+    return np.array(lines, dtype=np.intp)
+
+
+"""
+BatchConnect4Env class
+runs N connect 4 games at the same time in lockstep
+all the boards are kept in one (N, rows, cols) int8 array so every function works on
+all of the games at once instead of looping over them in python
+0 = empty, 1 = player 1, 2 = player 2 (the same as Connect4Board)
+"""
+class BatchConnect4Env:
+    def __init__(self, num_envs, rows=6, cols=7, auto_reset=True):
+        self.num_envs = num_envs
+        self.rows = rows
+        self.cols = cols
+        self.auto_reset = auto_reset
+        self.lines = win_lines(rows, cols)
+        self.boards = np.zeros((num_envs, rows, cols), dtype=np.int8)
+        self.heights = np.zeros((num_envs, cols), dtype=np.int8)  # pieces in each column
+        self.current_player = np.ones(num_envs, dtype=np.int8)
+        self.moves_played = np.zeros(num_envs, dtype=np.int16)
+        self.env_index = np.arange(num_envs)
+
+    """
+    reset(self, mask) resets the boards back to empty
+    mask is a boolean array of which games to reset (all of them if None)
+    """
+    def reset(self, mask=None):
+        if mask is None:
+            mask = np.ones(self.num_envs, dtype=bool)
+        self.boards[mask] = 0
+        self.heights[mask] = 0
+        self.current_player[mask] = 1
+        self.moves_played[mask] = 0
+        return self.get_board_states()
+
+    """
+    valid_move_mask() returns a (N, cols) boolean array of which columns are not full
+    """
+    def valid_move_mask(self):
+        return self.heights < self.rows
+
+    """
+    get_board_states() gets the flattened boards for the ai, shape (N, rows * cols)
+    """
+    def get_board_states(self):
+        return self.boards.reshape(self.num_envs, -1).copy()
+
+    """
+    check_winner(self, players) checks which games have four in a row for the given players
+    players is an array with the player to check for in each game
+    returns a boolean array with one value per game
+    """
+    def check_winner(self, players):
+        flat = self.boards.reshape(self.num_envs, -1)
+        cells = flat[:, self.lines]  # (N, num_lines, 4)
+        players = np.asarray(players, dtype=np.int8).reshape(-1, 1, 1)
+        return np.all(cells == players, axis=2).any(axis=1)
+
+    """
+    set_states(self, states, players) puts every game into a given position
+    states is an (N, rows * cols) array of flattened boards
+    players is an array with the player to move in each game
+    """
+    def set_states(self, states, players):
+        self.boards[:] = np.asarray(states, dtype=np.int8).reshape(self.boards.shape)
+        self.heights[:] = (self.boards != 0).sum(axis=1)
+        self.moves_played[:] = self.heights.sum(axis=1)
+        self.current_player[:] = players
+        return self.get_board_states()
+
+    """
+    step(self, actions, mask) makes one move in every game for whoever's turn it is
+    actions is an array with one column per game
+    mask is a boolean array of which games move (all of them if None), the rest are left alone
+    returns (next_states, winners, dones)
+    next_states are the boards right after the move (before any auto reset)
+    winners is 1 or 2 for games that were just won and 0 otherwise
+    dones is True for games that were won or filled up
+    games that finish are reset automatically when auto_reset is on
+    """
+    def step(self, actions, mask=None):
+        index = self.env_index if mask is None else self.env_index[mask]
+        actions = np.asarray(actions, dtype=np.intp)[index]
+        if not self.valid_move_mask()[index, actions].all():
+            raise ValueError("Invalid move: column is full")
+        players = self.current_player[index].copy()
+        rows = self.rows - 1 - self.heights[index, actions]
+        self.boards[index, rows, actions] = players
+        self.heights[index, actions] += 1
+        self.moves_played[index] += 1
+        moved = np.zeros(self.num_envs, dtype=bool)
+        moved[index] = True
+        won = self.check_winner(self.current_player) & moved
+        dones = won | (moved & (self.moves_played == self.rows * self.cols))
+        winners = np.where(won, self.current_player, 0).astype(np.int8)
+        next_states = self.get_board_states()
+        self.current_player[index] = 3 - players
+        if self.auto_reset and dones.any():
+            self.reset(dones)
+        return next_states, winners, dones
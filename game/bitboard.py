@@ -0,0 +1,170 @@
+import numpy as np
+from game.zobrist import zobrist_keys
+
+"""
+Connect 4 Bitboard class
+a faster version of Connect4Board that keeps the board as two integers (one per player)
+each column uses rows + 1 bits, bit 0 is the bottom of the column and the extra top bit
+is always empty so that the shifts in check_winner never wrap into the next column
+it has the same functions as Connect4Board so it can be passed anywhere a board is used
+"""
+class Connect4Bitboard:
+    def __init__(self, rows=6, cols=7):
+        self.rows = rows
+        self.cols = cols
+        self.height = rows + 1  # bits per column (including the empty top bit)
+        self.bitboards = [0, 0]  # bitboards[0] = player 1, bitboards[1] = player 2
+        self.heights = [c * self.height for c in range(cols)]  # next free bit in each column
+        self.moves_played = 0
+        # the flattened board (one byte per cell) kept up to date by make_move and undo_move,
+        # so get_board_state is one copy instead of rebuilding the grid from the bitboards
+        self.cells = bytearray(rows * cols)
+        self.zobrist = zobrist_keys(rows, cols)
+        self.hash = 0  # zobrist hash of the position, kept up to date by make_move and undo_move
+        self.mirror_hash = 0  # zobrist hash of the left/right mirror image of the position
+        # cell_bits[r][c] is the bit for board row r (0 = top) and column c
+        self.cell_bits = np.array(
+            [[1 << (c * self.height + rows - 1 - r) for c in range(cols)] for r in range(rows)],
+            dtype=np.uint64
+        )
+
+    """
+    reset() resets board to original state
+    """
+    def reset(self):
+        self.bitboards = [0, 0]
+        self.heights = [c * self.height for c in range(self.cols)]
+        self.moves_played = 0
+        self.cells = bytearray(self.rows * self.cols)
+        self.hash = 0
+        self.mirror_hash = 0
+
+    """
+    is_valid_move(self, col) checks if move is valid by seeing if col is full or not
+    col is the column that the piece is wanted to be placed in
+    """
+    def is_valid_move(self, col):
+        if col < 0 or col >= self.cols:
+            return False
+        return self.heights[col] < col * self.height + self.rows
+
+    """
+    make_move(self, col, player) makes a move, returns row where new piece is
+    col is column of new move
+    player is who is making the move
+    """
+    def make_move(self, col, player):
+        if not self.is_valid_move(col):
+            return -1
+        bit = self.heights[col]
+        self.bitboards[player - 1] |= 1 << bit
+        self.heights[col] += 1
+        self.moves_played += 1
+        row = self.rows - 1 - (bit - col * self.height)
+        self.cells[row * self.cols + col] = player
+        self.hash ^= self.zobrist[player][row * self.cols + col]
+        self.mirror_hash ^= self.zobrist[player][row * self.cols + self.cols - 1 - col]
+        return row
+
+    """
+    undo_move(self, col) takes back the top piece in a column, returns the row it was in
+    col is the column to take the piece out of
+    """
+    def undo_move(self, col):
+        if self.heights[col] == col * self.height:
+            return -1
+        self.heights[col] -= 1
+        bit = self.heights[col]
+        player = 1 if self.bitboards[0] >> bit & 1 else 2
+        mask = ~(1 << bit)
+        self.bitboards[0] &= mask
+        self.bitboards[1] &= mask
+        self.moves_played -= 1
+        row = self.rows - 1 - (bit - col * self.height)
+        self.cells[row * self.cols + col] = 0
+        self.hash ^= self.zobrist[player][row * self.cols + col]
+        self.mirror_hash ^= self.zobrist[player][row * self.cols + self.cols - 1 - col]
+        return row
+
+    """
+    check_winner(self, player, last_row, last_col) checks if player has four in a row
+    player is the player who put down the move (to know which pieces to look at)
+    last_row and last_col are only kept so it matches Connect4Board, the shifts check the
+    whole board at once so they are not needed
+    """
+    def check_winner(self, player, last_row=None, last_col=None):
+        bb = self.bitboards[player - 1]
+        # vertical, horizontal, diagonal /, diagonal \
+        for shift in (1, self.height, self.height + 1, self.height - 1):
+            pairs = bb & (bb >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+
+    """
+    get_valid_moves() returns list of valid column numbers
+    """
+    def get_valid_moves(self):
+        return [col for col in range(self.cols) if self.heights[col] < col * self.height + self.rows]
+
+    """
+    is_full() checks if board is full
+    """
+    def is_full(self):
+        return self.moves_played == self.rows * self.cols
+
+    """
+    board is the 6x7 array version of the board so the display and the ai can still use it
+    0 = empty, 1 = player 1, 2 = player 2
+    """
+    @property
+    def board(self):
+        return self.get_board_state().reshape(self.rows, self.cols)
+
+    """
+    get_board_state() gets current state of the board for the ai
+    """
+    def get_board_state(self):
+        return np.frombuffer(self.cells, dtype=np.int8).copy()
+
+    """
+    set_state(self, state) sets the board to match a flattened board from get_board_state()
+    state is the flattened board (0 = empty, 1 = player 1, 2 = player 2)
+    """
+    def set_state(self, state):
+        self.reset()
+        grid = np.asarray(state).reshape(self.rows, self.cols)
+        # drop the pieces in from the bottom row up so the heights and hashes come out right
+        for row in range(self.rows - 1, -1, -1):
+            for col in range(self.cols):
+                if grid[row][col] != 0:
+                    self.make_move(col, int(grid[row][col]))
+
+    """
+    key() returns one integer that is different for every position
+    player 2's pieces are shifted above player 1's so the two never overlap
+    """
+    def key(self):
+        return self.bitboards[0] | (self.bitboards[1] << (self.height * self.cols))
+
+    """
+    copy() copies the board so we dont mess it up when checking
+    only the integers and the heights list need copying so this is much cheaper than deepcopy
+    """
+    def copy(self):
+        new = Connect4Bitboard.__new__(Connect4Bitboard)
+        new.rows = self.rows
+        new.cols = self.cols
+        new.height = self.height
+        new.bitboards = list(self.bitboards)
+        new.heights = list(self.heights)
+        new.moves_played = self.moves_played
+        new.cells = bytearray(self.cells)
+        new.zobrist = self.zobrist
+        new.hash = self.hash
+        new.mirror_hash = self.mirror_hash
+        new.cell_bits = self.cell_bits
+        return new
+
+    def __str__(self):
+        return str(self.board)
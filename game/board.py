@@ -1,5 +1,5 @@
 import numpy as np
-import copy
+from game.zobrist import zobrist_keys, zobrist_hash
 
 """
 Connect 4 Board class
@@ -12,6 +12,9 @@ class Connect4Board:
         self.cols = cols
         self.board = np.zeros((rows, cols), dtype=int)
         # 0 = empty, 1 = player 1, 2 = player 2
+        self.zobrist = zobrist_keys(rows, cols)
+        self.hash = 0  # zobrist hash of the position, kept up to date by make_move and undo_move
+        self.mirror_hash = 0  # zobrist hash of the left/right mirror image of the position
 
     """
     reset() resets board to original state
@@ -20,6 +23,8 @@ class Connect4Board:
         for r in range(self.rows):
             for c in range(self.cols):
                 self.board[r][c] = 0
+        self.hash = 0
+        self.mirror_hash = 0
 
     """
     is_valid_move(self, col) checks if move is valid by seeing if col is full or not
@@ -41,6 +46,21 @@ class Connect4Board:
         for row in range(self.rows - 1, -1, -1):
             if self.board[row][col] == 0:
                 self.board[row][col] = player
+                self.hash ^= self.zobrist[player][row * self.cols + col]
+                self.mirror_hash ^= self.zobrist[player][row * self.cols + self.cols - 1 - col]
+                return row
+        return -1
+
+    """
+    undo_move(self, col) takes back the top piece in a column, returns the row it was in
+    col is the column to take the piece out of
+    """
+    def undo_move(self, col):
+        for row in range(self.rows):
+            if self.board[row][col] != 0:
+                self.hash ^= self.zobrist[self.board[row][col]][row * self.cols + col]
+                self.mirror_hash ^= self.zobrist[self.board[row][col]][row * self.cols + self.cols - 1 - col]
+                self.board[row][col] = 0
                 return row
         return -1
 
@@ -97,12 +117,42 @@ class Connect4Board:
     def get_board_state(self):
         return self.board.flatten()
 
+    """
+    set_state(self, state) sets the board to match a flattened board from get_board_state()
+    state is the flattened board (0 = empty, 1 = player 1, 2 = player 2)
+    """
+    def set_state(self, state):
+        grid = np.asarray(state).reshape(self.rows, self.cols)
+        self.board[:] = grid
+        self.hash = zobrist_hash(grid, self.rows, self.cols)
+        self.mirror_hash = zobrist_hash(grid[:, ::-1], self.rows, self.cols)
+
     """
     copy() copies the board so we dont mess it up when checking
+    only the grid needs copying, the zobrist keys are shared between boards
     """
     def copy(self):
-        new = copy.deepcopy(self)
+        new = Connect4Board.__new__(Connect4Board)
+        new.rows = self.rows
+        new.cols = self.cols
+        new.board = self.board.copy()
+        new.zobrist = self.zobrist
+        new.hash = self.hash
+        new.mirror_hash = self.mirror_hash
         return new
 
     def __str__(self):
-        return str(self.board)
\ No newline at end of file
+        return str(self.board)
+
+
+"""
+make_board(backend, rows, cols) creates a board with the chosen backend
+backend is 'array' for Connect4Board or 'bitboard' for the faster Connect4Bitboard
+"""
+def make_board(backend='array', rows=6, cols=7):
+    if backend == 'array':
+        return Connect4Board(rows, cols)
+    elif backend == 'bitboard':
+        from game.bitboard import Connect4Bitboard
+        return Connect4Bitboard(rows, cols)
+    raise ValueError(f"Invalid board backend. Choose from {['array', 'bitboard']}")
@@ -0,0 +1,30 @@
+import numpy as np
+
+"""
+symmetry has helpers for connect 4's left/right mirror symmetry
+a position and its mirror image are worth the same, with every column c swapped for cols - 1 - c
+"""
+
+"""
+mirror_state(state, rows, cols) flips a flattened board left to right
+"""
+def mirror_state(state, rows=6, cols=7):
+    state = np.asarray(state)
+    return state.reshape(-1, rows, cols)[:, :, ::-1].reshape(state.shape)
+
+
+"""
+mirror_action(action, cols) returns the column that matches action on the mirrored board
+"""
+def mirror_action(action, cols=7):
+    return cols - 1 - action
+
+
+"""
+canonical_hash(position_hash, mirror_hash) picks one key for a position and its mirror
+returns (key, flipped) where flipped is True when the key belongs to the mirror image
+"""
+def canonical_hash(position_hash, mirror_hash):
+    if mirror_hash < position_hash:
+        return mirror_hash, True
+    return position_hash, False
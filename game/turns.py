@@ -0,0 +1,32 @@
+import numpy as np
+
+"""
+turns works out whose turn it is from the pieces on a board
+the players take turns, so whoever has fewer pieces is the one to move
+when they have the same number it depends on who went first, which the board can't show,
+so the caller says which player that is (usually the agent asking, since it is its turn)
+"""
+
+"""
+players_to_move(states, first_player) returns whose turn it is on every board in an (N, 42) array
+first_player is who is to move on boards where both players have the same number of pieces
+"""
+def players_to_move(states, first_player=1):
+    states = np.asarray(states)
+    p1 = np.count_nonzero(states == 1, axis=1)
+    p2 = np.count_nonzero(states == 2, axis=1)
+    return np.where(p1 > p2, 2, np.where(p2 > p1, 1, first_player))
+
+
+"""
+player_to_move(state, first_player) is players_to_move for one flattened board
+"""
+def player_to_move(state, first_player=1):
+    state = np.asarray(state)
+    p1 = np.count_nonzero(state == 1)
+    p2 = np.count_nonzero(state == 2)
+    if p1 > p2:
+        return 2
+    if p2 > p1:
+        return 1
+    return first_player
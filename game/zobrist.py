@@ -0,0 +1,44 @@
+import numpy as np
+
+"""
+zobrist has the random tables used to hash connect 4 positions
+a position's hash is the xor of one random 64-bit number for every (player, cell) that has a piece,
+so a move (or undoing one) only has to xor in a single number to keep the hash up to date
+the tables come from a fixed seed so the same position gets the same hash every run
+"""
+
+tables = {}
+key_lists = {}
+
+"""
+zobrist_table(rows, cols) returns the table for a board size as a (3, rows * cols) uint64 array
+row 0 (empty cells) is all zeros so a whole board can be hashed with one lookup per cell
+"""
+def zobrist_table(rows=6, cols=7):
+    if (rows, cols) not in tables:
+        rng = np.random.default_rng(rows * 1000 + cols)
+        table = rng.integers(0, 2 ** 64, size=(3, rows * cols), dtype=np.uint64)
+        table[0] = 0
+        tables[(rows, cols)] = table
+    return tables[(rows, cols)]
+
+
+"""
+zobrist_keys(rows, cols) returns the same table as nested lists of python ints
+which are faster than numpy scalars for the one-xor-per-move updates in the boards
+every board of a size shares one copy, so the lists must not be changed
+"""
+def zobrist_keys(rows=6, cols=7):
+    if (rows, cols) not in key_lists:
+        key_lists[(rows, cols)] = zobrist_table(rows, cols).tolist()
+    return key_lists[(rows, cols)]
+
+
+"""
+zobrist_hash(state, rows, cols) hashes a flattened board from scratch
+it gives the same number as the hash a board keeps up to date in make_move
+"""
+def zobrist_hash(state, rows=6, cols=7):
+    table = zobrist_table(rows, cols)
+    cells = np.asarray(state).reshape(-1).astype(np.intp)
+    return int(np.bitwise_xor.reduce(table[cells, np.arange(rows * cols)]))
@@ -1,11 +1,18 @@
+import time
+startup_start = time.perf_counter()  # taken before the other imports so they are timed too
 import random
 import pygame
 import sys
 from ai.training import TrainingManager
 from game.board import Connect4Board
 from ai.q_agent import QAgent
+from ai.search_agent import SearchAgent
+from ai.hybrid_agent import HybridAgent
+from ai.mcts_agent import MCTSAgent
+from ai.opening_book import load_opening_book
 from game.display import Connect4Display
 from utils.file_manager import ModelManager
+imports_done = time.perf_counter()
 
 """
 Connect4Game is a reinforcement learning project that allows you to play connect4 againt an ai
@@ -24,6 +31,9 @@ class GameManager:
         self.board = Connect4Board()
         self.display = Connect4Display(self.screen)
         self.agent = QAgent()
+        self.opponent = self.agent  # who the human plays against in play mode
+        self.search_budget_ms = 150  # how long the hybrid opponent may think per move
+        self.opening_book = load_opening_book()  # None until one is built with python -m ai.opening_book
         self.model_manager = ModelManager()
         self.trainer = TrainingManager(self.agent, self.board)
         self.state = 'MENU'
@@ -35,6 +45,8 @@ class GameManager:
         self.selected_model_index = 0
         self.x=0
         self.model_name_choice = "untrained model"
+        self.init_done = time.perf_counter()
+        self.startup_reported = False
 
     """
     run() runs the game loop
@@ -64,10 +76,24 @@ class GameManager:
             elif self.state == 'MODEL MANAGEMENT':
                 self.model_management_menu()
             pygame.display.flip()
+            if not self.startup_reported:
+                self.report_startup()
             self.clock.tick(60)
         pygame.quit()
         sys.exit()
 
+    """
+    report_startup() prints how long it took to get from starting python to the first menu frame
+    tensorflow is only loaded when a model is trained, played or loaded, so it is not in here
+    """
+    def report_startup(self):
+        first_frame = time.perf_counter()
+        print(f"Startup: imports {(imports_done - startup_start) * 1000:.0f} ms, "
+              f"init {(self.init_done - imports_done) * 1000:.0f} ms, "
+              f"first menu frame {(first_frame - self.init_done) * 1000:.0f} ms, "
+              f"total {(first_frame - startup_start) * 1000:.0f} ms")
+        self.startup_reported = True
+
     """
     handle_menu_events(self, event) handles user selection from menu options
     event is feedback from the keyboard event item
@@ -117,17 +143,14 @@ class GameManager:
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_y:
                         model_name = self.model_manager.generate_model_name(self.model_name_choice)
-                        metadata = {'episode': self.trainer.training_stats['total_episodes'],
-                                'win_rate': self.trainer.get_training_progress()['win_rate']}
                         self.model_manager.save_model(
                             self.agent,
                             model_name,
                             {
-                                'episode': self.trainer.training_stats['total_episodes'],
-                                'win_rate': self.trainer.get_training_progress()['win_rate']
+                                'episodes': self.trainer.training_stats['total_episodes'],
+                                'win_rate': self.trainer.training_stats['win_rate']
                             }
                         )
-                        self.model_manager.save_metadata(model_name, metadata)
                         self.trainer.initialize(model_name)
                         waiting_for_save = False
                     elif event.key == pygame.K_n:
@@ -211,10 +234,12 @@ class GameManager:
             {
                 'episodes': training_stats['total_episodes'],
                 'win_rate': training_stats['win_rate'],
-                'final_epsilon': training_stats.get('final_epsilon', 0)
+                'final_epsilon': training_stats.get('final_epsilon', 0),
+                'wins': training_stats['wins'],
+                'losses': training_stats['losses'],
+                'draws': training_stats['draws']
             }
         )
-        self.model_manager.save_metadata(model_name, training_stats)
         self.state = 'MENU'
 
     """
@@ -381,6 +406,13 @@ class GameManager:
                             self.state = 'MENU'
                             return
                 return
+            # the search agents need no trained model, so they are always on the list
+            num_models = len(saved_models)
+            builtin_opponents = [
+                ('Search AI (alpha-beta)', lambda: SearchAgent(player=2)),
+                ('Monte Carlo AI (MCTS)', lambda: MCTSAgent(time_budget_ms=self.search_budget_ms * 4, player=2)),
+            ]
+            saved_models.extend((name, {}) for name, _ in builtin_opponents)
             # Show model selection menu (similar to your training_mode logic)
             selecting = True
             selected_model_index = 0
@@ -392,9 +424,19 @@ class GameManager:
                         elif event.key == pygame.K_DOWN:
                             selected_model_index = (selected_model_index + 1) % len(saved_models)
                         elif event.key == pygame.K_RETURN:
-                            # Load the selected model
-                            model_path = saved_models[selected_model_index][0]
-                            self.agent.load_model(model_path)
+                            if selected_model_index >= num_models:
+                                self.opponent = builtin_opponents[selected_model_index - num_models][1]()
+                            else:
+                                # Load the selected model
+                                model_path = saved_models[selected_model_index][0]
+                                self.agent.load_model(model_path)
+                                self.agent.player = 2
+                                self.opponent = self.agent
+                            selecting = False
+                        elif event.key == pygame.K_h and selected_model_index < num_models:
+                            # play the selected model with a few moves of lookahead on top
+                            self.agent.load_model(saved_models[selected_model_index][0])
+                            self.opponent = HybridAgent(self.agent, time_budget_ms=self.search_budget_ms, player=2)
                             selecting = False
                         elif event.key == pygame.K_ESCAPE:
                             self.state = 'MENU'
@@ -408,6 +450,9 @@ class GameManager:
                     color = (255, 255, 0) if i == selected_model_index else (255, 255, 255)
                     text = font.render(f"Model {i}: {model[0]}", True, color)
                     self.screen.blit(text, (250, 150 + i * 50))
+                hint_font = pygame.font.Font(None, 24)
+                hint = hint_font.render('ENTER: Play model   H: Play model with lookahead', True, (200, 200, 200))
+                self.screen.blit(hint, (250, 550))
                 pygame.display.flip()
                 self.x = self.x + 1
 
@@ -441,7 +486,15 @@ class GameManager:
                 valid_moves = self.board.get_valid_moves()
                 if valid_moves:
                     state = self.board.get_board_state()
-                    col = self.agent.act(state, valid_moves)
+                    col = None
+                    if self.opening_book is not None:
+                        col = self.opening_book.lookup(self.board.hash, self.board.mirror_hash,
+                                                       self.current_player)
+                    if col not in valid_moves:
+                        col = self.opponent.act(state, valid_moves, self.board.hash, self.board.mirror_hash)
+                        if isinstance(self.opponent, MCTSAgent):
+                            print(f"MCTS: {self.opponent.simulations} simulations "
+                                  f"({self.opponent.sims_per_second:.0f}/sec, {self.opponent.reused_visits} reused)")
                     row = self.board.make_move(col, self.current_player)
                     if self.board.check_winner(self.current_player, row, col):
                         self.game_over = True
@@ -516,7 +569,7 @@ class GameManager:
                         selected_model = (selected_model + 1) % len(models)
                     elif event.key == pygame.K_DELETE:
                         if models:
-                            self.model_manager.delete_model(models[selected_model]['name'])
+                            self.model_manager.delete_model(models[selected_model][0])
                             models.pop(selected_model)
                             if selected_model >= len(models):
                                 selected_model = len(models) - 1
@@ -0,0 +1,105 @@
+import random
+import numpy as np
+from game.board import Connect4Board
+from game.bitboard import Connect4Bitboard
+
+"""
+test_bitboard_parity plays random games on both board backends side by side
+and checks that Connect4Bitboard gives the same answers as Connect4Board after every move and undo
+run it from the project folder with: python -m pytest tests
+"""
+
+NUM_GAMES = 500
+
+
+"""
+assert_same(array_board, bitboard) checks everything a caller can read off the two boards
+"""
+def assert_same(array_board, bitboard):
+    assert bitboard.get_valid_moves() == array_board.get_valid_moves()
+    assert bitboard.is_full() == array_board.is_full()
+    assert np.array_equal(bitboard.board, array_board.board)
+    assert np.array_equal(bitboard.get_board_state(), array_board.get_board_state())
+    assert bitboard.hash == array_board.hash
+    assert bitboard.mirror_hash == array_board.mirror_hash
+
+
+"""
+play_random_game(rng, array_board, bitboard) plays the same random moves on both boards until the game ends
+returns the columns that were played
+"""
+def play_random_game(rng, array_board, bitboard):
+    moves = []
+    player = 1
+    while True:
+        assert_same(array_board, bitboard)
+        valid_moves = array_board.get_valid_moves()
+        if not valid_moves:
+            return moves
+        col = rng.choice(valid_moves)
+        row = array_board.make_move(col, player)
+        assert bitboard.make_move(col, player) == row
+        moves.append(col)
+        won = array_board.check_winner(player, row, col)
+        assert bitboard.check_winner(player, row, col) == won
+        # the game stops at the first win, so the other player can never have four in a row
+        assert not bitboard.check_winner(3 - player)
+        if won:
+            assert_same(array_board, bitboard)
+            return moves
+        player = 3 - player
+
+
+def test_random_games_match():
+    rng = random.Random(0)
+    for _ in range(NUM_GAMES):
+        array_board, bitboard = Connect4Board(), Connect4Bitboard()
+        play_random_game(rng, array_board, bitboard)
+
+
+def test_undo_matches():
+    rng = random.Random(1)
+    for _ in range(NUM_GAMES):
+        array_board, bitboard = Connect4Board(), Connect4Bitboard()
+        moves = play_random_game(rng, array_board, bitboard)
+        for col in reversed(moves):
+            assert bitboard.undo_move(col) == array_board.undo_move(col)
+            assert_same(array_board, bitboard)
+        assert array_board.hash == 0 and bitboard.hash == 0
+        assert bitboard.undo_move(0) == array_board.undo_move(0) == -1
+
+
+def test_full_column_is_rejected():
+    array_board, bitboard = Connect4Board(), Connect4Bitboard()
+    for i in range(array_board.rows):
+        player = i % 2 + 1
+        assert bitboard.make_move(3, player) == array_board.make_move(3, player)
+    assert not bitboard.is_valid_move(3) and not array_board.is_valid_move(3)
+    assert bitboard.make_move(3, 1) == array_board.make_move(3, 1) == -1
+    assert_same(array_board, bitboard)
+
+
+def test_copy_is_independent():
+    rng = random.Random(2)
+    array_board, bitboard = Connect4Board(), Connect4Bitboard()
+    for player in (1, 2, 1, 2):
+        col = rng.randrange(array_board.cols)
+        array_board.make_move(col, player)
+        bitboard.make_move(col, player)
+    array_copy, bitboard_copy = array_board.copy(), bitboard.copy()
+    array_copy.make_move(0, 1)
+    bitboard_copy.make_move(0, 1)
+    assert_same(array_copy, bitboard_copy)
+    assert_same(array_board, bitboard)
+    assert not np.array_equal(bitboard.board, bitboard_copy.board)
+
+
+def test_set_state_matches():
+    rng = random.Random(3)
+    for _ in range(50):
+        array_board, bitboard = Connect4Board(), Connect4Bitboard()
+        play_random_game(rng, array_board, bitboard)
+        state = array_board.get_board_state()
+        array_board.set_state(state)
+        bitboard.set_state(state)
+        assert_same(array_board, bitboard)
@@ -0,0 +1,74 @@
+import os
+import queue
+import shutil
+import threading
+import numpy as np
+
+"""
+AsyncWriter class
+runs save jobs on a background thread so that saving never stalls the training loop
+the queue is bounded, so if saves are requested faster than the disk can keep up the
+caller waits for a free spot instead of piling up snapshots in memory
+jobs must only use data that was already copied (a snapshot), never the live model
+"""
+class AsyncWriter:
+    def __init__(self, max_pending=2):
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, name='AsyncWriter', daemon=True)
+        self.thread.start()
+
+    """
+    submit(self, job, *args) queues job(*args) to run on the writer thread
+    """
+    def submit(self, job, *args):
+        self.jobs.put((job, args))
+
+    """
+    wait() blocks until every queued job has been written
+    """
+    def wait(self):
+        self.jobs.join()
+
+    """
+    _run() is the writer thread loop
+    """
+    def _run(self):
+        while True:
+            job, args = self.jobs.get()
+            try:
+                job(*args)
+            except Exception as e:
+                print(f"Error saving in background: {e}")
+            finally:
+                self.jobs.task_done()
+
+
+"""
+atomic_path(path) gives the temporary path to write to before replace_atomic(path) swaps it in
+"""
+def atomic_path(path):
+    root, ext = os.path.splitext(path)
+    # keep the extension at the end because keras and numpy check it
+    return root + '.tmp' + ext
+
+
+"""
+replace_atomic(path) moves the finished temporary file over path in one step,
+so a crash part way through a save never leaves a half written file behind
+"""
+def replace_atomic(path):
+    os.replace(atomic_path(path), path)
+
+
+"""
+write_arrays(arrays, directory) writes a dictionary of numpy arrays as one .npy file per entry in directory
+it is written to a temporary folder first and then swapped in so a crash never leaves half of them behind
+"""
+def write_arrays(arrays, directory):
+    tmp_directory = directory + '.tmp'
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp_directory, name + '.npy'), values)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(tmp_directory, directory)
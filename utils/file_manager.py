@@ -1,9 +1,14 @@
 import os
 import json
+import atexit
+import shutil
+import threading
 from collections import deque
 from datetime import datetime
 
-import keras
+import numpy as np
+
+from utils.async_writer import AsyncWriter, atomic_path, replace_atomic, write_arrays
 
 """
 Model Manager class
@@ -11,8 +16,11 @@ manages the different saved models
 contains functions that help load, save, and use models
 """
 class ModelManager:
-    def __init__(self, models_dir="models/saved_models"):
+    def __init__(self, models_dir="models/saved_models", checkpoints_dir="models/checkpoints"):
         self.models_dir = models_dir
+        self.checkpoints_dir = checkpoints_dir
+        self.writer = None
+        self.catalog_lock = threading.Lock()
         self.ensure_directory_exists()
 
     """
@@ -33,32 +41,116 @@ class ModelManager:
             return f"connect4_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
 
     """
-    list_saved_models() gives the user a list of presaved models to choose from when loading models
+    list_saved_models(self, sort_by, reverse, min_episodes, min_win_rate) gives the user a list of
+    presaved models to choose from when loading models, as (filename, metadata) pairs
+    it reads the one catalog file instead of opening every metadata file
+    sort_by is a metadata key to sort by (like 'episodes' or 'win_rate'), None sorts by name
+    reverse sorts from biggest to smallest
+    min_episodes and min_win_rate leave out models below them
     """
-    def list_saved_models(self):
+    def list_saved_models(self, sort_by=None, reverse=False, min_episodes=None, min_win_rate=None):
         if not os.path.exists(self.models_dir):
             return []
-        files = os.listdir(self.models_dir)
-        model_files = [f for f in files if f.endswith('.keras')]
-        result = []
-        for filename in model_files:
-            metadata = self.load_metadata(filename)
-            result.append((filename, metadata))
+        result = sorted(self.load_catalog()['models'].items())
+        if min_episodes is not None:
+            result = [(f, m) for f, m in result if m.get('episodes', 0) >= min_episodes]
+        if min_win_rate is not None:
+            result = [(f, m) for f, m in result if m.get('win_rate', 0) >= min_win_rate]
+        if sort_by is not None:
+            result.sort(key=lambda model: model[1].get(sort_by, 0), reverse=reverse)
+        elif reverse:
+            result.reverse()
         return result
 
     """
-    save_model(self, agent, model_name, metadata) saves the model
+    catalog_path() is where the catalog of saved models is kept
+    it sits next to the models folder (not in it) so writing it does not change the folder's mtime
+    """
+    def catalog_path(self):
+        return os.path.normpath(self.models_dir) + '_catalog.json'
+
+    """
+    _dir_mtime() returns the models folder's modified time, which changes whenever a file in it is
+    added, removed or replaced
+    """
+    def _dir_mtime(self):
+        return os.stat(self.models_dir).st_mtime_ns
+
+    """
+    _read_catalog() reads the catalog file without checking it, returns None if it is missing or broken
+    """
+    def _read_catalog(self):
+        try:
+            with open(self.catalog_path(), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    """
+    load_catalog() returns the catalog of saved models {'dir_mtime': ..., 'models': {filename: metadata}}
+    if the models folder changed since the catalog was written it is rebuilt first
+    """
+    def load_catalog(self):
+        catalog = self._read_catalog()
+        if catalog is not None and catalog.get('dir_mtime') == self._dir_mtime():
+            return catalog
+        return self.rebuild_catalog()
+
+    """
+    rebuild_catalog() scans the models folder and writes a new catalog
+    """
+    def rebuild_catalog(self):
+        with self.catalog_lock:
+            models = {}
+            for filename in os.listdir(self.models_dir):
+                if filename.endswith('.keras') and not filename.endswith('.tmp.keras'):
+                    models[filename] = self.load_metadata(filename)
+            return self._write_catalog(models)
+
+    """
+    _update_catalog(self, dir_mtime_before, filename, metadata) changes one model in the catalog
+    dir_mtime_before is the models folder mtime from before the model's files were written, if the
+    catalog was not up to date with it something else changed the folder so it is rebuilt instead
+    filename is the .keras file of the model
+    metadata is the model's new metadata, or None if the model was deleted
+    """
+    def _update_catalog(self, dir_mtime_before, filename, metadata):
+        with self.catalog_lock:
+            catalog = self._read_catalog()
+            if catalog is not None and catalog.get('dir_mtime') == dir_mtime_before:
+                if metadata is None:
+                    catalog['models'].pop(filename, None)
+                else:
+                    catalog['models'][filename] = metadata
+                self._write_catalog(catalog['models'])
+                return
+        self.rebuild_catalog()
+
+    """
+    _write_catalog(self, models) atomically writes the catalog with the folder's current mtime
+    """
+    def _write_catalog(self, models):
+        catalog = {'dir_mtime': self._dir_mtime(), 'models': models}
+        path = self.catalog_path()
+        with open(atomic_path(path), 'w') as f:
+            json.dump(catalog, f)
+        replace_atomic(path)
+        return catalog
+
+    """
+    save_model(self, agent, model_name, metadata, background) saves the model
     agent is the model that is being saved
     model_name is the name of the model
     metadata is the actual data of the model
+    background writes the files on the writer thread instead of waiting for them
     """
-    def save_model(self, agent, model_name=None, metadata=None):
+    def save_model(self, agent, model_name=None, metadata=None, background=False):
         self.ensure_directory_exists()
         if model_name.endswith(".pkl"):
             model_name = model_name[:-4]
         filepath = os.path.join(self.models_dir, model_name)
-        # Save model weights
-        agent.save_model(filepath + '.keras')
+        # copy the weights now so training can keep changing the live model
+        snapshot = self.snapshot_model(agent)
         # Save additional training metadata
         if metadata is None:
             metadata = {}
@@ -73,16 +165,74 @@ class ModelManager:
                 serializable_metadata[key] = value.tolist()
             else:
                 serializable_metadata[key] = value
+        if background:
+            self.get_writer().submit(self._write_model, filepath, snapshot, serializable_metadata)
+        else:
+            self._write_model(filepath, snapshot, serializable_metadata)
+
+    """
+    snapshot_model(self, agent) copies what is needed to rebuild agent's q network
+    (its config with the compile settings and a copy of its weights and optimizer state) and its replay memory
+    """
+    def snapshot_model(self, agent):
+        import keras
+        optimizer = agent.q_network.optimizer
+        return {
+            'config': keras.saving.serialize_keras_object(agent.q_network),
+            'weights': agent.q_network.get_weights(),
+            'optimizer': [v.numpy() for v in optimizer.variables] if optimizer.built else None,
+            'memory': agent.memory.get_state() if len(agent.memory) > 0 else None
+        }
+
+    """
+    _write_model(self, filepath, snapshot, metadata) writes a snapshot to the .keras and metadata files
+    and the replay memory to a _memory folder of .npy files next to them
+    they are all written to temporary files first and then swapped in
+    """
+    def _write_model(self, filepath, snapshot, metadata):
+        import keras
+        dir_mtime_before = self._dir_mtime()
+        model = keras.saving.deserialize_keras_object(snapshot['config'])
+        model.set_weights(snapshot['weights'])
+        if snapshot['optimizer'] is not None:
+            # the rebuilt model has a fresh optimizer, give it the live one's state so it is saved too
+            model.optimizer.build(model.trainable_variables)
+            for variable, value in zip(model.optimizer.variables, snapshot['optimizer']):
+                variable.assign(value)
+        model.save(atomic_path(filepath + '.keras'))
+        replace_atomic(filepath + '.keras')
+        if snapshot['memory'] is not None:
+            write_arrays(snapshot['memory'], filepath + '_memory')
         # Save metadata
         try:
-            with open(filepath + '_metadata.json', 'w') as f:
-                json.dump(serializable_metadata, f)
+            with open(atomic_path(filepath + '_metadata.json'), 'w') as f:
+                json.dump(metadata, f)
+            replace_atomic(filepath + '_metadata.json')
         except Exception as e:
             print(f"Error saving metadata: {e}")
+        self._update_catalog(dir_mtime_before, os.path.basename(filepath) + '.keras', metadata)
+
+    """
+    get_writer() starts the background writer the first time it is needed
+    any saves still being written are finished before python exits
+    """
+    def get_writer(self):
+        if self.writer is None:
+            self.writer = AsyncWriter()
+            atexit.register(self.writer.wait)
+        return self.writer
+
+    """
+    wait_for_saves() blocks until every background save has been written
+    """
+    def wait_for_saves(self):
+        if self.writer is not None:
+            self.writer.wait()
 
     """
     load_model(self, model_name) loads the specified model
     model_name is the name of the model that is going to be loaded
+    the replay memory saved with it is not loaded here, QAgent.load_model loads it into the agent
     """
     def load_model(self, model_name):
         if model_name.endswith(".pkl"):
@@ -90,7 +240,8 @@ class ModelManager:
         if not model_name.endswith(".keras"):
             model_name = model_name + ".keras"
         filepath = os.path.join(self.models_dir, model_name)
-        # Load model weights
+        # Load model weights (keras is imported here so listing models never loads tensorflow)
+        import keras
         model = keras.models.load_model(filepath)
         # Load metadata
         try:
@@ -100,9 +251,6 @@ class ModelManager:
             self.total_episodes = metadata.get('episodes', 0)
             self.epsilon = metadata.get('epsilon', 1.0)
 
-            # Restore memory if applicable
-            if 'memory' in metadata:
-                self.memory = deque(metadata['memory'], maxlen=2000)
         except FileNotFoundError:
             print("No metadata found, starting from scratch")
         except Exception as e:
@@ -114,15 +262,31 @@ class ModelManager:
     model_name is the name of the model that is going to be deleted
     """
     def delete_model(self, model_name):
+        model_name = self._strip_extension(model_name)
+        filepath = os.path.join(self.models_dir, model_name)
+        dir_mtime_before = self._dir_mtime()
         try:
-            os.remove(os.path.join(self.models_dir, model_name + '.pkl'))
-            os.remove(os.path.join(self.models_dir, model_name + '.json'))
+            os.remove(filepath + '.keras')
+            if os.path.exists(filepath + '_metadata.json'):
+                os.remove(filepath + '_metadata.json')
+            shutil.rmtree(filepath + '_memory', ignore_errors=True)
             return True
         except FileNotFoundError:
             return False
         except Exception as e:
             print(f"Error deleting model: {e}")
             return False
+        finally:
+            self._update_catalog(dir_mtime_before, model_name + '.keras', None)
+
+    """
+    _strip_extension(self, model_name) takes .keras (or the old .pkl) off the end of a model name
+    """
+    def _strip_extension(self, model_name):
+        for extension in ('.keras', '.pkl'):
+            if model_name.endswith(extension):
+                return model_name[:-len(extension)]
+        return model_name
 
     """
     get_model_info(self, model_name) returns the model information
@@ -137,17 +301,21 @@ class ModelManager:
     metadata is the actual data of the model
     """
     def save_metadata(self, model_name, metadata):
-        metadata_filename = model_name.replace('.keras', '_metadata.json')
-        metadata_path = os.path.join(self.models_dir, metadata_filename)
-        with open(metadata_path, 'w') as f:
+        model_name = self._strip_extension(model_name)
+        metadata_path = os.path.join(self.models_dir, model_name + '_metadata.json')
+        dir_mtime_before = self._dir_mtime()
+        with open(atomic_path(metadata_path), 'w') as f:
             json.dump(metadata, f, indent=2)  # indent=2 makes it readable
+        replace_atomic(metadata_path)
+        if os.path.exists(os.path.join(self.models_dir, model_name + '.keras')):
+            self._update_catalog(dir_mtime_before, model_name + '.keras', metadata)
 
     """
     load_metadata(self, model_name) loads the metadata of the model
     model_name is the name of the model
     """
     def load_metadata(self, model_name):
-        metadata_filename = model_name.replace('.keras', '_metadata.json')
+        metadata_filename = self._strip_extension(model_name) + '_metadata.json'
         metadata_path = os.path.join(self.models_dir, metadata_filename)
         # Try to load the JSON file
         try:
@@ -155,3 +323,97 @@ class ModelManager:
                 return json.load(f)
         except FileNotFoundError:
             return {}  # No metadata found, return empty dict
+
+    """
+    save_checkpoint(self, agent, name, state, background) saves everything needed to resume training
+    (both networks, the optimizer, epsilon, the replay memory and the training state)
+    everything is copied right away and then written on the writer thread, so training keeps
+    going while the checkpoint is saved. it is written to a temporary folder first and then
+    swapped in, so a crash while saving never leaves a broken checkpoint behind
+    agent is the QAgent being trained
+    name is the name of the checkpoint (usually the model name)
+    state is a dictionary of training progress from the TrainingManager
+    background writes the files on the writer thread instead of waiting for them
+    """
+    def save_checkpoint(self, agent, name, state, background=True):
+        state = dict(state)
+        state['epsilon'] = agent.epsilon
+        state['agent_episodes'] = agent.total_episodes
+        state['agent_config'] = agent.get_config()
+        state['moves_remembered'] = agent.moves_remembered
+        weights = {}
+        for i, w in enumerate(agent.q_network.get_weights()):
+            weights[f'q_{i}'] = w
+        for i, w in enumerate(agent.target_network.get_weights()):
+            weights[f'target_{i}'] = w
+        optimizer = agent.q_network.optimizer
+        if not optimizer.built:
+            # before the first gradient step the optimizer has no slot variables yet, build them so
+            # the checkpoint has the same variables load_checkpoint will expect
+            optimizer.build(agent.q_network.trainable_variables)
+        for i, v in enumerate(optimizer.variables):
+            weights[f'optimizer_{i}'] = v.numpy()
+        memory = agent.memory.get_state()
+        if background:
+            self.get_writer().submit(self._write_checkpoint, name, weights, memory, state)
+        else:
+            self._write_checkpoint(name, weights, memory, state)
+
+    """
+    _write_checkpoint(self, name, weights, memory, state) writes a checkpoint snapshot to disk
+    """
+    def _write_checkpoint(self, name, weights, memory, state):
+        os.makedirs(self.checkpoints_dir, exist_ok=True)
+        path = os.path.join(self.checkpoints_dir, name)
+        tmp_path = path + '.tmp'
+        old_path = path + '.old'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.savez(os.path.join(tmp_path, 'weights.npz'), **weights)
+        write_arrays(memory, os.path.join(tmp_path, 'memory'))
+        with open(os.path.join(tmp_path, 'state.json'), 'w') as f:
+            json.dump(state, f, indent=2)
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    """
+    load_checkpoint(self, agent, name) loads a checkpoint saved by save_checkpoint into agent
+    returns the saved training state, or None if there is no checkpoint called name
+    raises ValueError if agent is set up differently (like prioritized or n_step) from the agent that was saved
+    """
+    def load_checkpoint(self, agent, name):
+        self.wait_for_saves()
+        path = os.path.join(self.checkpoints_dir, name)
+        if not os.path.exists(os.path.join(path, 'state.json')):
+            # a crash in the middle of swapping leaves the last good checkpoint in .old
+            path = path + '.old'
+            if not os.path.exists(os.path.join(path, 'state.json')):
+                return None
+        with open(os.path.join(path, 'state.json'), 'r') as f:
+            state = json.load(f)
+        saved_config = state.get('agent_config')
+        if saved_config is not None and saved_config != agent.get_config():
+            raise ValueError(f"Checkpoint {name} was saved with agent settings {saved_config}, "
+                             f"not {agent.get_config()}")
+        with np.load(os.path.join(path, 'weights.npz')) as weights:
+            num_weights = len(agent.q_network.get_weights())
+            agent.q_network.set_weights([weights[f'q_{i}'] for i in range(num_weights)])
+            agent.weights_updated()
+            agent.target_network.set_weights([weights[f'target_{i}'] for i in range(num_weights)])
+            optimizer = agent.q_network.optimizer
+            if not optimizer.built:
+                optimizer.build(agent.q_network.trainable_variables)
+            saved = [key for key in weights.files if key.startswith('optimizer_')]
+            if len(saved) == len(optimizer.variables):
+                for i, variable in enumerate(optimizer.variables):
+                    variable.assign(weights[f'optimizer_{i}'])
+            else:
+                print("Checkpoint optimizer state does not match, starting with a fresh optimizer")
+        agent.memory.load(os.path.join(path, 'memory'))
+        agent.moves_remembered = state.get('moves_remembered', len(agent.memory))
+        agent.epsilon = state['epsilon']
+        agent.total_episodes = state['agent_episodes']
+        return state